@@ -0,0 +1,80 @@
+''' What does drawing a crowded scene cost, one Actor.draw (and one blit) at a 
+time, versus drawObjects collecting the culled blits and submitting each depth 
+layer with a single Surface.blits?  Every actor is inside the camera.
+
+Then, on a level LEVEL_SCALE times the camera's size each way, what does 
+getCulledObjects save by skipping the actors off screen before any per-actor 
+call, rather than having each one turn itself down?'''
+
+import random
+
+import pygame
+
+import common
+
+from qQuest import constants, graphics
+from qQuest.graphics import Actor
+from qQuest.lib.itemLib import ITEMS
+
+NUM_FRAMES = 20
+ACTOR_COUNTS = [100, 1000, 5000]
+LEVEL_SCALE = 4
+
+
+def drawOneByOne(surface, objects, camera):
+    ''' The old drawObjects: per object draw(), per sprite blit. '''
+    for depth in constants.DEPTHS:
+        for gameObj in objects[depth]:
+            gameObj.draw(surface, camera=camera)
+
+def makeCrowdedLevel(width, height, numActors, spriteDicts):
+    level = common.makeLevel(width, height)
+    for x, y in common.randomFloorCoords(level, numActors):
+        level.addObject(Actor((x, y), level=level, depth='itemDepth',
+                              spriteDict=random.choice(spriteDicts)))
+    camera = graphics.Camera()
+    camera.x, camera.y = width/2, height/2
+    return level, camera
+
+def run():
+    common.initDisplay()
+    mapSurface = pygame.Surface((constants.CAMERA_WIDTH_P, constants.CAMERA_HEIGHT_P))
+    spriteDicts = [item['spriteDict'] for item in ITEMS.values()]
+
+    print(f'{"actors":>8} {"one by one (ms)":>16} {"batched (ms)":>13} '
+          f'{"blits only (ms)":>16}')
+    for numActors in ACTOR_COUNTS:
+        level, camera = makeCrowdedLevel(constants.CAMERA_WIDTH, constants.CAMERA_HEIGHT,
+                                         numActors, spriteDicts)
+
+        oneByOneTime = common.bestTimePerCall(
+            lambda: drawOneByOne(mapSurface, level.objects, camera), NUM_FRAMES)
+        batchedTime = common.bestTimePerCall(
+            lambda: graphics.drawObjects(mapSurface, level.objects, camera=camera), 
+            NUM_FRAMES)
+        objectBlits = graphics.getObjectBlits(level.objects, camera=camera)
+        blitsOnlyTime = common.bestTimePerCall(
+            lambda: graphics.drawObjects(mapSurface, level.objects, objectBlits=objectBlits),
+            NUM_FRAMES)
+        print(f'{numActors:>8} {oneByOneTime*1e3:>16.2f} {batchedTime*1e3:>13.2f} '
+              f'{blitsOnlyTime*1e3:>16.2f}')
+
+    print(f'\nlevel {LEVEL_SCALE}x the camera each way')
+    print(f'{"actors":>8} {"unculled (ms)":>14} {"culled (ms)":>12}')
+    for numActors in ACTOR_COUNTS:
+        level, camera = makeCrowdedLevel(LEVEL_SCALE*constants.CAMERA_WIDTH, 
+                                         LEVEL_SCALE*constants.CAMERA_HEIGHT,
+                                         numActors, spriteDicts)
+        unculledTime = common.bestTimePerCall(
+            lambda: graphics.drawObjects(mapSurface, level.objects, camera=camera),
+            NUM_FRAMES)
+        culledTime = common.bestTimePerCall(
+            lambda: graphics.drawObjects(mapSurface, 
+                                         graphics.getCulledObjects(level, camera=camera),
+                                         camera=camera),
+            NUM_FRAMES)
+        print(f'{numActors:>8} {unculledTime*1e3:>14.2f} {culledTime*1e3:>12.2f}')
+
+
+if __name__ == "__main__":
+    run()
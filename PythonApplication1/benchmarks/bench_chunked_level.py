@@ -0,0 +1,81 @@
+''' How much memory does a level hold on to as the world gets bigger?  The
+player walks a straight line across a generated world (see
+chunks.GeneratedChunkSource), as a ChunkedLevel, recalculating its FOV and
+taking a simulation tick every step.  For the sizes that fit, the same world
+built whole as a plain Level is measured for comparison.'''
+
+import time
+import tracemalloc
+
+import numpy as np
+
+import common
+
+from qQuest import constants
+from qQuest.chunks import ChunkedLevel, GeneratedChunkSource
+from qQuest.game import GAME
+from qQuest.levelfile import ENTITY_DTYPE, LevelLayout
+from qQuest.levels import Level
+from qQuest.tilegrid import TILE_TYPE_KEYS
+
+WORLD_SIZES = [2048, 4096, 32768, 131072]
+MAX_WHOLE_LEVEL_SIZE = 4096
+NUM_STEPS = 800
+
+
+def walk(level: Level) -> int:
+    ''' Walk the player NUM_STEPS cells east from the middle of level.
+    Returns the most chunks loaded at once.'''
+    GAME.player = None
+    x = y = level.mapWidth // 2
+    level.setCellTiles(x, y, ['floor_dungeon_1'])
+    level.addPlayer(x, y)
+    maxChunks = 0
+    for step in range(NUM_STEPS):
+        level.moveObject(GAME.player, x+step, y)
+        GAME.player.recalculateFov()
+        level.takeCreatureTurns()
+        maxChunks = max(maxChunks, len(getattr(level, 'chunks', ())))
+    return maxChunks
+
+def buildWholeLevel(source: GeneratedChunkSource) -> Level:
+    ''' Every chunk of source as one plain Level, its layout's key table
+    being the tile type ids.  Tiles only, no entities.'''
+    cs = constants.CHUNK_SIZE
+    numChunks = source.width // cs
+    rows = [np.concatenate([source.getChunk((cx, cy))[0] for cx in range(numChunks)], axis=2)
+            for cy in range(numChunks)]
+    level = Level(f'whole{source.width}', loadFromFile=False)
+    level.layout = LevelLayout([''] + TILE_TYPE_KEYS[1:], np.concatenate(rows, axis=1),
+                               np.zeros(0, dtype=ENTITY_DTYPE))
+    level.parseLayout()
+    return level
+
+def run():
+    common.initDisplay()
+    print(f'{"world":>14} {"whole Level (MB)":>17} {"chunked peak (MB)":>18} '
+          f'{"max chunks":>11} {"ms/step":>8}')
+    for size in WORLD_SIZES:
+        source = GeneratedChunkSource(seed=0, width=size, height=size)
+
+        wholeMB = '-'
+        if size <= MAX_WHOLE_LEVEL_SIZE:
+            tracemalloc.start()
+            level = buildWholeLevel(source)
+            wholeMB = f'{tracemalloc.get_traced_memory()[0]/2**20:.1f}'
+            tracemalloc.stop()
+            del level
+
+        tracemalloc.start()
+        level = ChunkedLevel(f'world{size}', source=source)
+        startTime = time.perf_counter()
+        maxChunks = walk(level)
+        stepTime = (time.perf_counter() - startTime) / NUM_STEPS
+        _, peakBytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{f"{size}x{size}":>14} {wholeMB:>17} {peakBytes/2**20:>18.2f} '
+              f'{maxChunks:>11} {stepTime*1e3:>8.2f}')
+
+
+if __name__ == "__main__":
+    run()
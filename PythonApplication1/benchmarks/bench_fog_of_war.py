@@ -0,0 +1,32 @@
+''' Does the fog of war pass cost the same on small and huge maps?  It should
+only ever visit the cells inside the camera window.'''
+
+import pygame
+
+import common
+
+from qQuest import constants, graphics
+from qQuest.game import GAME
+
+NUM_FRAMES = 50
+MAP_SIZES = [(30, 20), (100, 100), (250, 250), (500, 500)]
+
+
+def run():
+    common.initDisplay()
+    mapSurface = pygame.Surface((constants.CAMERA_WIDTH_P, constants.CAMERA_HEIGHT_P))
+
+    print(f'{"map size":>10} {"fog (ms)":>10}')
+    for width, height in MAP_SIZES:
+        level = common.makeLevel(width, height)
+        level.addPlayer(width//2, height//2)
+        camera = graphics.Camera(viewer=GAME.player)
+
+        fogTime = common.timePerCall(
+            lambda: graphics.drawFogOfWar(mapSurface, level, camera, GAME.player),
+            NUM_FRAMES)
+        print(f'{f"{width}x{height}":>10} {fogTime*1e3:>10.2f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,59 @@
+''' How long does reading a level take, from JSON (.lvl) versus the binary 
+format (.lvlb), and how big are the files?  Levels are generated walled rooms 
+with pillars, a monster in every hundredth cell.  The binary file is memory-
+mapped, so its pages are only read as the level's arrays are first touched.
+
+As in the game, the binary file is checked against the .lvl it came from: 
+normally by mtime and size alone, but by crc32 once the .lvl has been touched
+(say, by a checkout) without being changed.'''
+
+import json
+import os
+import random
+import tempfile
+
+import common
+
+from qQuest import levelfile
+
+LEVEL_SIZES = [100, 300, 1000]
+MONSTER_FRACTION = 0.01
+
+
+def makeLevelDict(size: int) -> dict:
+    levelDict = common.makeLevelDict(size, size, pillarFraction=0.2)
+    levelDict["decoderRing"]["j"] = "jelly"
+    for row in levelDict["level"]:
+        for x, cell in enumerate(row):
+            if cell == "_" and random.random() < MONSTER_FRACTION:
+                row[x] = "_j"
+    return levelDict
+
+def loadJson(fileName: str) -> levelfile.LevelLayout:
+    with open(fileName, "r") as levelFile:
+        return levelfile.layoutFromLevelDict(json.load(levelFile))
+
+def run():
+    random.seed(0)
+    print(f'{"size":>10} {"json (ms)":>10} {"binary (ms)":>12} {"touched (ms)":>13} '
+          f'{"json (kB)":>10} {"binary (kB)":>12}')
+    with tempfile.TemporaryDirectory() as tempDir:
+        for size in LEVEL_SIZES:
+            jsonName = os.path.join(tempDir, f'{size}.lvl')
+            binaryName = os.path.join(tempDir, f'{size}.lvlb')
+            with open(jsonName, "w") as levelFile:
+                json.dump(makeLevelDict(size), levelFile)
+            levelfile.saveLevelLayout(loadJson(jsonName), binaryName, sourceName=jsonName)
+            loadBinary = lambda: levelfile.loadLevelLayout(binaryName, sourceName=jsonName)
+
+            jsonTime = common.bestTimePerCall(lambda: loadJson(jsonName), 1, numRepeats=3)
+            binaryTime = common.bestTimePerCall(loadBinary, 5)
+            os.utime(jsonName)
+            touchedTime = common.bestTimePerCall(loadBinary, 5)
+            print(f'{f"{size}x{size}":>10} {jsonTime*1e3:>10.2f} {binaryTime*1e3:>12.3f} '
+                  f'{touchedTime*1e3:>13.3f} {os.path.getsize(jsonName)/1024:>10.0f} '
+                  f'{os.path.getsize(binaryName)/1024:>12.0f}')
+
+
+if __name__ == "__main__":
+    run()
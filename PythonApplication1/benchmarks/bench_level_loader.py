@@ -0,0 +1,49 @@
+''' How long does the main thread stop for a level to be ready to play?
+Built on the spot, that's the whole Level plus its first background compile.
+Through a LevelLoader, it's prefetch() plus the longest of the once a frame
+update() calls until the level is ready; the rest happens on the worker.'''
+
+import time
+
+import common
+
+from qQuest import graphics
+from qQuest.levelloader import LevelLoader
+from qQuest.levels import Level
+
+LEVEL_NAMES = ["town3", "mapwPIES4", "mapwPIES3", "town", "town2"]
+FRAME_TIME = 1 / 60
+
+
+def buildOnTheSpot(levelName: str) -> float:
+    startTime = time.perf_counter()
+    level = Level(levelName)
+    graphics.compileBackgroundTiles(level.tileGrid)
+    return time.perf_counter() - startTime
+
+def buildThroughLoader(levelName: str) -> float:
+    ''' Longest main thread stall, with a frame's sleep between updates. '''
+    loader = LevelLoader(numWorkers=1)
+    startTime = time.perf_counter()
+    loader.prefetch(levelName)
+    longest = time.perf_counter() - startTime
+    while levelName not in loader.levels:
+        time.sleep(FRAME_TIME)
+        startTime = time.perf_counter()
+        loader.update(None)
+        longest = max(longest, time.perf_counter() - startTime)
+    loader.pool.shutdown()
+    return longest
+
+def run():
+    common.initDisplay()
+    graphics.ASSETS.warmUp()
+    print(f'{"level":>12} {"on the spot (ms)":>17} {"loader stall (ms)":>18}')
+    for levelName in LEVEL_NAMES:
+        spotTime = min(buildOnTheSpot(levelName) for _ in range(5))
+        loaderTime = min(buildThroughLoader(levelName) for _ in range(5))
+        print(f'{levelName:>12} {spotTime*1e3:>17.2f} {loaderTime*1e3:>18.2f}')
+
+
+if __name__ == "__main__":
+    run()
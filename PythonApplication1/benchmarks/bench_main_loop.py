@@ -0,0 +1,168 @@
+''' A headless, repeatable run of the game's main loop, for tracking 
+simulation and rendering throughput between changes:
+
+    python PythonApplication1/benchmarks/bench_main_loop.py --ticks 2000 --seed 1
+    python PythonApplication1/benchmarks/bench_main_loop.py --levels town3 mapwPIES4 --renderer dirty
+
+Without --levels this is the game's own setup (initializeGame), its levels
+built as the player nears them; with --loader-workers 0, the default, they
+are built inline, so that every run plays out the same.  Given levels are
+loaded in order, each one's last free portal coupled to the next one's 
+first free portal.
+
+The player follows a scripted input stream: a file of "tick key" lines, where
+key is up, down, left or right (a step), or a pygame key name handled in play,
+such as g or y.  Without --script it is a random walk, from --seed.  Any menu
+that opens (say, talking to an NPC) is dismissed straight away.
+
+Ticks are uncapped: CLOCK is never ticked.  Sprite animations run off the 
+measured fps, so they stand still, and every run draws the same frames.
+'''
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import common
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+from qQuest import constants, graphics
+from qQuest.game import GAME
+from qQuest.levels import Level
+from qQuest.profiler import PROFILER
+
+MOVES = {'up': (0, -1), 'down': (0, 1), 'left': (-1, 0), 'right': (1, 0)}
+RANDOM_WALK_KEYS = ['up', 'down', 'left', 'right', 'g', 'y']
+RANDOM_WALK_EVERY = 8 # ticks between scripted key presses
+
+
+def loadGameModule():
+    ''' The game's qQuest.py, which shares its name with the qQuest package. '''
+    fileName = os.path.join(os.path.dirname(__file__), '..', 'qQuest.py')
+    spec = importlib.util.spec_from_file_location('qQuestMain', fileName)
+    gameModule = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gameModule)
+    return gameModule
+
+def loadLevels(levelNames):
+    levels = [Level(levelName) for levelName in levelNames]
+    GAME.levels.extend(levels)
+    for level, nextLevel in zip(levels, levels[1:]):
+        exits = [portal for portal in level.portals if portal.destinationPortal is None]
+        entrances = [portal for portal in nextLevel.portals if portal.destinationPortal is None]
+        if exits and entrances:
+            GAME.couplePortals(exits[-1], entrances[0])
+
+    GAME.currentLevel = levels[0]
+    if levels[0].portals:
+        levels[0].placePlayerAtPortal(levels[0].portals[0])
+    else:
+        x, y = next((x, y) for y in range(levels[0].mapHeight) 
+                           for x in range(levels[0].mapWidth)
+                           if not levels[0].tileIsBlocking(x, y))
+        levels[0].addPlayer(x, y)
+    GAME.viewer = GAME.player
+    GAME.camera = graphics.Camera(viewer=GAME.player)
+
+def readScript(fileName):
+    ''' {tick: [key names]} from "tick key" lines. '''
+    script = {}
+    with open(fileName) as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            tick, key = line.split()
+            script.setdefault(int(tick), []).append(key)
+    return script
+
+def makeRandomWalk(numTicks):
+    return {tick: [random.choice(RANDOM_WALK_KEYS)] 
+            for tick in range(0, numTicks, RANDOM_WALK_EVERY)}
+
+def pressKey(gameModule, keyName):
+    if keyName in MOVES:
+        GAME.player.scheduleMove(*MOVES[keyName])
+    else:
+        event = pygame.event.Event(pygame.KEYDOWN, key=pygame.key.key_code(keyName))
+        gameModule.handleOtherGameInputs(event)
+
+def getPeakMemoryMB():
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes vs KB
+
+def run(args):
+    if resource is None:
+        tracemalloc.start()
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    gameModule = loadGameModule()
+    gameModule.initializeDisplay()
+    constants.LEVEL_LOADER_WORKERS = args.loader_workers
+    if args.levels:
+        loadLevels(args.levels)
+    else:
+        gameModule.initializeGame()
+
+    script = readScript(args.script) if args.script else makeRandomWalk(args.ticks)
+    dirtyRectRenderer = None
+    if args.renderer == 'dirty':
+        dirtyRectRenderer = graphics.DirtyRectRenderer()
+    dismissMenu = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_q)
+
+    PROFILER.reset(args.ticks)
+    startTime = time.perf_counter()
+    for tick in range(args.ticks):
+        PROFILER.startFrame()
+        with PROFILER.section('input'):
+            pygame.event.clear()
+            pygame.event.post(dismissMenu)
+            for keyName in script.get(tick, []):
+                pressKey(gameModule, keyName)
+        with PROFILER.section('loading'):
+            GAME.updateLevels()
+        gameModule.updateGame()
+        if args.renderer != 'none' and tick % args.render_every == 0:
+            gameModule.drawFrame(dirtyRectRenderer)
+        PROFILER.endFrame()
+    elapsed = time.perf_counter() - startTime
+
+    print(f'levels: {", ".join(level.levelName for level in GAME.levels)}')
+    print(f'renderer: {args.renderer} (every {args.render_every} ticks), '
+          f'seed: {args.seed}, ticks: {args.ticks}')
+    print(f'player ends on {GAME.currentLevel.levelName} at {GAME.player.x}, {GAME.player.y}')
+    print(f'ticks/sec: {args.ticks/elapsed:.1f}')
+    print(f'peak memory: {getPeakMemoryMB():.1f} MB')
+    print("\n".join("{:<11}".format(row[0]) + "".join("{:>9}".format(cell) for cell in row[1:])
+                    for row in PROFILER.getOverlayRows()))
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--levels', nargs='+', metavar='LEVEL', 
+                        help='level file names, without .lvl')
+    parser.add_argument('--ticks', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', metavar='FILE', help='"tick key" lines')
+    parser.add_argument('--renderer', choices=['full', 'dirty', 'none'], default='full')
+    parser.add_argument('--render-every', type=int, default=1, metavar='N',
+                        help='draw a frame every N simulation ticks')
+    parser.add_argument('--loader-workers', type=int, default=0, metavar='N',
+                        help='threads building levels; 0 builds them inline')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parseArgs())
@@ -0,0 +1,50 @@
+''' How does field of view scale with the number of Viewers?  Compares each
+Viewer running its own FOV against the Level's batched Perception, inline 
+and on a thread pool.  Every round moves all the viewers somewhere new, so 
+the FOV cache doesn't get to help.'''
+
+import common
+
+from qQuest.characters import Viewer
+from qQuest.perception import Perception
+
+NUM_ROUNDS = 5
+VIEWER_COUNTS = [1, 50, 500]
+NUM_WORKERS = 4
+
+
+def run():
+    common.initDisplay()
+    level = common.makeLevel(200, 200, pillarFraction=0.1)
+
+    print(f'{"viewers":>8} {"one by one (ms)":>16} {"batched (ms)":>13} '
+          f'{f"{NUM_WORKERS} threads (ms)":>16}')
+    for numViewers in VIEWER_COUNTS:
+        viewers = [Viewer(pos, level=level) for pos in common.randomFloorCoords(level, numViewers)]
+
+        def scatterViewers():
+            level.fovCache.clear()
+            for viewer, (x, y) in zip(viewers, common.randomFloorCoords(level, numViewers)):
+                viewer.x, viewer.y = x, y
+
+        def oneByOne():
+            scatterViewers()
+            for viewer in viewers:
+                viewer.recalculateFov()
+
+        def batched(perception):
+            scatterViewers()
+            for viewer in viewers:
+                perception.request(viewer)
+            perception.resolve()
+
+        inlinePerception = Perception(level, numWorkers=0)
+        pooledPerception = Perception(level, numWorkers=NUM_WORKERS)
+        times = [common.timePerCall(oneByOne, NUM_ROUNDS),
+                 common.timePerCall(lambda: batched(inlinePerception), NUM_ROUNDS),
+                 common.timePerCall(lambda: batched(pooledPerception), NUM_ROUNDS)]
+        print(f'{numViewers:>8} {times[0]*1e3:>16.2f} {times[1]*1e3:>13.2f} {times[2]*1e3:>16.2f}')
+
+
+if __name__ == "__main__":
+    run()
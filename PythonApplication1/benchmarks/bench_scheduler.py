@@ -0,0 +1,44 @@
+''' Does the creature tick scale with what creatures are doing rather than 
+with how many there are?  Passive NPCs spend most of their time waiting or
+thinking, which the level's Scheduler sleeps through; jellies wander, and 
+moving takes a tick's work every tick.  Each is compared against ticking 
+every creature, as Level.takeCreatureTurns used to.'''
+
+import common
+
+NUM_TICKS = 100
+CREATURE_COUNTS = [100, 1000, 5000]
+CHARACTER_NAMES = ['townNPC', 'jelly']
+
+
+def makePopulatedLevel(characterName: str, numCreatures: int) -> 'levels.Level':
+    level = common.makeLevel(150, 150)
+    for x, y in common.randomFloorCoords(level, numCreatures):
+        level.addCharacter(x, y, characterName)
+    return level
+
+def tickEveryCreature(level: 'levels.Level') -> None:
+    for creature in list(level.creatures):
+        creature.resolveQueueTick()
+
+def run():
+    common.initDisplay()
+    print(f'{"creature":>9} {"count":>6} {"every (ms)":>11} {"scheduled (ms)":>15} {"awake":>7}')
+    for characterName in CHARACTER_NAMES:
+        for numCreatures in CREATURE_COUNTS:
+            level = makePopulatedLevel(characterName, numCreatures)
+            everyTime = common.bestTimePerCall(lambda: tickEveryCreature(level), NUM_TICKS)
+
+            level = makePopulatedLevel(characterName, numCreatures)
+            numAwake = []
+            def tick():
+                level.scheduler.tick()
+                numAwake.append(level.scheduler.numAwake)
+            scheduledTime = common.bestTimePerCall(tick, NUM_TICKS)
+
+            print(f'{characterName:>9} {numCreatures:>6} {everyTime*1e3:>11.3f} '
+                  f'{scheduledTime*1e3:>15.3f} {sum(numAwake)/len(numAwake):>7.0f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,35 @@
+''' How do position queries and the creature tick scale with the number of
+actors in a level?  With the Level's spatial index, objectsAtCoords (and hence
+checkForCreature and QueuedMove) should cost the same no matter how many 
+actors share the level.'''
+
+import common
+
+NUM_TICKS = 100
+NUM_QUERIES = 10000
+ACTOR_COUNTS = [10, 100, 500, 1000, 2000]
+
+
+def run():
+    common.initDisplay()
+    print(f'{"actors":>8} {"query (us)":>12} {"tick (ms)":>10} {"tick/actor (us)":>16}')
+    for numActors in ACTOR_COUNTS:
+        level = common.makeLevel(100, 100)
+        for x, y in common.randomFloorCoords(level, numActors):
+            level.addCharacter(x, y, 'jelly')
+        for x, y in common.randomFloorCoords(level, numActors):
+            level.addItem(x, y, 'healingPotion')
+
+        queries = common.randomFloorCoords(level, NUM_QUERIES)
+        queryIter = iter(queries)
+        queryTime = common.timePerCall(lambda: level.checkForCreature(*next(queryIter)),
+                                       NUM_QUERIES)
+        tickTime = common.timePerCall(level.takeCreatureTurns, NUM_TICKS)
+
+        numCreatures = len(level.creatures)
+        print(f'{numActors:>8} {queryTime*1e6:>12.2f} {tickTime*1e3:>10.2f} '
+              f'{tickTime*1e6/numCreatures:>16.2f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,56 @@
+''' How long does building a level's tiles take, how much memory do they hold
+on to, and what does a tileIsBlocking check cost?  Levels are walled rooms 
+with a fifth of the floor turned to wall, built straight from a LevelLayout so
+that only Level.parseLayout is timed.'''
+
+import random
+import tracemalloc
+
+import numpy as np
+
+import common
+
+from qQuest.levelfile import ENTITY_DTYPE, LevelLayout
+from qQuest.levels import Level
+
+LEVEL_SIZES = [100, 500, 1000]
+PILLAR_FRACTION = 0.2
+NUM_LOOKUPS = 10000
+
+
+def makeLayout(size: int) -> LevelLayout:
+    keys = ['', 'floor_dungeon_1', 'wall_dungeon_1']
+    rng = np.random.default_rng(0)
+    layer = np.where(rng.random((size, size)) < PILLAR_FRACTION, 2, 1).astype(np.uint8)
+    layer[[0, -1], :] = 2
+    layer[:, [0, -1]] = 2
+    return LevelLayout(keys, layer[np.newaxis], np.zeros(0, dtype=ENTITY_DTYPE))
+
+def buildLevel(layout: LevelLayout) -> Level:
+    level = Level(f'bench{layout.width}x{layout.height}', loadFromFile=False)
+    level.layout = layout
+    level.parseLayout()
+    return level
+
+def run():
+    print(f'{"size":>10} {"build (ms)":>11} {"held (MB)":>10} {"blocking check (ns)":>20}')
+    for size in LEVEL_SIZES:
+        layout = makeLayout(size)
+        buildTime = common.bestTimePerCall(lambda: buildLevel(layout), 1, numRepeats=3)
+
+        tracemalloc.start()
+        level = buildLevel(layout)
+        heldBytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        cells = [(random.randrange(size), random.randrange(size)) for _ in range(NUM_LOOKUPS)]
+        def checkCells():
+            for x, y in cells:
+                level.tileIsBlocking(x, y)
+        lookupTime = common.bestTimePerCall(checkCells, 1) / NUM_LOOKUPS
+        print(f'{f"{size}x{size}":>10} {buildTime*1e3:>11.2f} {heldBytes/2**20:>10.2f} '
+              f'{lookupTime*1e9:>20.0f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,69 @@
+''' Shared setup for the benchmark scripts in this folder.
+
+The benchmarks run headless (SDL's dummy video driver), and, like the game 
+itself, expect to be run from the repository root so that sprite paths 
+resolve, e.g.:
+    python PythonApplication1/benchmarks/bench_spatial_index.py
+'''
+
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame
+
+from qQuest import constants
+
+
+def initDisplay() -> pygame.Surface:
+    ''' Sprites are .convert()-ed on load, which needs a display mode set.'''
+    pygame.init()
+    return pygame.display.set_mode((constants.TOTAL_WIDTH_P, 
+                                    constants.TOTAL_HEIGHT_P))
+
+def makeLevelDict(width: int, height: int, pillarFraction: float=0.0) -> dict:
+    ''' A walled rectangular room in the same format as a .lvl file.  
+    pillarFraction of the floor is randomly turned into wall.'''
+    wallRow = ["#"] * width
+    floorRow = ["#"] + ["_"] * (width-2) + ["#"]
+    levelArray = [wallRow] + [list(floorRow) for _ in range(height-2)] + [wallRow]
+    for row in levelArray[1:-1]:
+        for x in range(1, width-1):
+            if random.random() < pillarFraction:
+                row[x] = "#"
+    return {"level": levelArray,
+            "decoderRing": {"_": "floor_dungeon_1", 
+                            "#": "wall_dungeon_1"}}
+
+def makeLevel(width: int, height: int, seed: int=0, 
+              pillarFraction: float=0.0) -> 'levels.Level':
+    ''' Build a Level straight from a generated level dictionary. '''
+    from qQuest.levels import Level
+
+    random.seed(seed)
+    level = Level(f'bench{width}x{height}', loadFromFile=False)
+    level.levelDict = makeLevelDict(width, height, pillarFraction=pillarFraction)
+    level.parseLevelDict()
+    return level
+
+def randomFloorCoords(level: 'levels.Level', num: int) -> List[Tuple[int]]:
+    ''' num random (x, y) cells inside the walls of a makeLevel level.'''
+    return [(random.randint(1, level.mapWidth-2), random.randint(1, level.mapHeight-2)) 
+            for _ in range(num)]
+
+def timePerCall(func: Callable, numCalls: int) -> float:
+    ''' Mean wall time of func(), in seconds. '''
+    start = time.perf_counter()
+    for _ in range(numCalls):
+        func()
+    return (time.perf_counter() - start) / numCalls
+
+def bestTimePerCall(func: Callable, numCalls: int, numRepeats: int=5) -> float:
+    ''' The best of numRepeats timePerCall runs; steadier on a busy machine.'''
+    return min(timePerCall(func, numCalls) for _ in range(numRepeats))
@@ -0,0 +1,46 @@
+''' Converts the JSON .lvl files in levels/ to the binary .lvlb format (see
+qQuest/levelfile.py), which the game loads in their place.  Re-run after
+editing a level; until then the game notices the .lvlb is out of date and
+reads the .lvl.
+
+    python convert_levels.py              # every level
+    python convert_levels.py town town2   # just these
+'''
+
+import argparse
+import glob
+import json
+import os
+
+from qQuest import levelfile
+
+LEVELS_DIR = os.path.join(os.path.dirname(__file__), "levels")
+
+
+def convertLevel(levelName: str) -> None:
+    sourceName = os.path.join(LEVELS_DIR, levelName+".lvl")
+    fileName = os.path.join(LEVELS_DIR, levelName+".lvlb")
+    with open(sourceName, "r") as levelFile:
+        levelDict = json.load(levelFile)
+
+    layout = levelfile.layoutFromLevelDict(levelDict)
+    levelfile.saveLevelLayout(layout, fileName, sourceName=sourceName)
+    print(f'{levelName:>16}: {layout.width}x{layout.height}, '
+          f'{len(layout.layers)} layers, {len(layout.entities)} entities, '
+          f'{os.path.getsize(sourceName)} -> {os.path.getsize(fileName)} bytes')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('levels', nargs='*', metavar='LEVEL',
+                        help='level names, without .lvl; all of levels/ by default')
+    args = parser.parse_args()
+
+    levelNames = args.levels or sorted(os.path.splitext(os.path.basename(fileName))[0]
+                                       for fileName in glob.glob(os.path.join(LEVELS_DIR, "*.lvl")))
+    for levelName in levelNames:
+        convertLevel(levelName)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from qQuest import constants, graphics
 from qQuest.characters import Creature
 from qQuest.graphics import Actor
 from qQuest.items import Item
-from qQuest.levels import Level, Tile, Portal
+from qQuest.levels import Level, Portal
 from qQuest.lib.characterLib import CHARACTERS
 from qQuest.lib.itemLib import ITEMS
 from qQuest.lib.portalLib import PORTALS
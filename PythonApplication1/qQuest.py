@@ -26,22 +26,35 @@ Basic Class & structure:
     - Items (and subclass Equipment), can contain Magic
 '''
 
+import argparse
+import time
+
 import pygame
 from pygame.locals import DOUBLEBUF, FULLSCREEN
 
 from qQuest import graphics, menus, constants
-from qQuest.levels import Level
+from qQuest.chunks import ChunkedLevel, GeneratedChunkSource
+from qQuest.levelloader import LevelLoader
 from qQuest.game import GAME
+from qQuest.profiler import PROFILER
 
+# made by initializeDisplay
+SURFACE_MAIN = None
+SURFACE_MAP = None
+SURFACE_CHYRON = None
 
 
-SURFACE_MAIN = pygame.display.set_mode((constants.TOTAL_WIDTH_P,                                                            constants.TOTAL_HEIGHT_P ),
-                                        FULLSCREEN | DOUBLEBUF)
+def initializeDisplay(flags: int=FULLSCREEN | DOUBLEBUF) -> None:
+    ''' Open the game window and make the surfaces the game is drawn on. '''
+    global SURFACE_MAIN, SURFACE_MAP, SURFACE_CHYRON
+    SURFACE_MAIN = pygame.display.set_mode((constants.TOTAL_WIDTH_P,
+                                            constants.TOTAL_HEIGHT_P), flags)
+    SURFACE_MAP = pygame.Surface((constants.CAMERA_WIDTH_P, constants.CAMERA_HEIGHT_P))
+    SURFACE_CHYRON = pygame.Surface((constants.TOTAL_WIDTH_P, constants.CHYRON_HEIGHT_P))
 
-SURFACE_MAP = pygame.Surface((constants.CAMERA_WIDTH_P, constants.CAMERA_HEIGHT_P))
-SURFACE_CHYRON = pygame.Surface((constants.TOTAL_WIDTH_P, constants.CHYRON_HEIGHT_P))
+    menus.DEFAULT_SURFACE = SURFACE_MAIN
 
-menus.DEFAULT_SURFACE = SURFACE_MAIN
+    graphics.ASSETS.warmUp()
 
 
 def handleMovementInputs():
@@ -72,6 +85,9 @@ def handleOtherGameInputs(event):
             return
         GAME.transitPortal(entryPortal)
 
+    if event.key == constants.PROFILER_KEY:
+        PROFILER.toggleOverlay()
+
 def handleMenuInputs(event):
     if event.key == pygame.K_p:
         menus.PauseMenu(SURFACE_MAIN)
@@ -104,55 +120,106 @@ def handleInputEvents():
     return "no-action"
 
 def exitGame():
+    PROFILER.stopCsv()
     pygame.quit()
     quit()
 
 def mainGameLoop(debugMode=None):
+    ''' Fixed timestep: the simulation catches up on however much time the last
+    frame took, in ticks of 1/SIMULATION_FPS, and the frame is drawn part way
+    into the next tick.  Slow drawing means fewer frames, not a slower game.'''
     playerAction = ""
+    dirtyRectRenderer = graphics.DirtyRectRenderer() if constants.DIRTY_RECT_RENDERING else None
+    tickLength = 1 / constants.SIMULATION_FPS
+    accumulator = 0.0
+    lastTime = time.perf_counter()
 
     while playerAction != "QUIT":
-        playerAction = handleInputEvents()
+        PROFILER.startFrame()
+        with PROFILER.section('input'):
+            playerAction = handleInputEvents()
+        with PROFILER.section('loading'):
+            GAME.updateLevels()
+
+        now = time.perf_counter()
+        accumulator += now - lastTime
+        lastTime = now
+        numTicks = 0
+        while accumulator >= tickLength and numTicks < constants.MAX_TICKS_PER_FRAME:
+            updateGame()
+            accumulator -= tickLength
+            numTicks += 1
+        accumulator = min(accumulator, tickLength) # too far behind; drop the rest
+
+        drawFrame(dirtyRectRenderer, debugMode, interpolation=accumulator/tickLength)
             
+        with PROFILER.section('tick'):
+            constants.CLOCK.tick(constants.GAME_FPS)
+        PROFILER.endFrame()
+
+    exitGame()
+
+def updateGame():
+    ''' One simulation tick. '''
+    with PROFILER.section('creatures'):
         GAME.currentLevel.takeCreatureTurns()
-        GAME.camera.updatePositionFromViewer()
 
-        if debugMode is None:
-            graphics.drawGame(SURFACE_MAIN, SURFACE_MAP, SURFACE_CHYRON, GAME)
-        elif debugMode == 'spriteList':
-            graphics.spriteDebugger(SURFACE_MAIN)
-            
-        constants.CLOCK.tick(constants.GAME_FPS)
+def drawFrame(dirtyRectRenderer: graphics.DirtyRectRenderer=None, debugMode=None,
+              interpolation: float=1.0):
+    ''' Draw the game, interpolation of the way into the next simulation tick. '''
+    graphics.INTERPOLATION = interpolation
+    with PROFILER.section('camera'):
+        GAME.camera.updatePositionFromViewer()
 
-    exitGame()
+    if debugMode is None and dirtyRectRenderer is not None:
+        dirtyRectRenderer.draw(SURFACE_MAIN, SURFACE_MAP, SURFACE_CHYRON, GAME)
+    elif debugMode is None:
+        graphics.drawGame(SURFACE_MAIN, SURFACE_MAP, SURFACE_CHYRON, GAME)
+    elif debugMode == 'spriteList':
+        graphics.spriteDebugger(SURFACE_MAIN)
 
 
-def initializeGame():
+def initializeGame(worldSeed: int=None):
+    ''' Set up the first level and the player.  The other levels load in the
+    background as the player nears the portals to them (see levelloader.py).
+    Given worldSeed, the game is instead a single generated world, loaded 
+    chunk by chunk (see chunks.py).'''
     pygame.init()
     pygame.key.set_repeat(200, 200) # Makes holding down keys work.  
 
-    if 1:
-        level0 = Level("town3")
-        GAME.levels.append(level0)
+    if worldSeed is not None:
+        world = ChunkedLevel("world", source=GeneratedChunkSource(seed=worldSeed))
+        GAME.levels.append(world)
+        GAME.currentLevel = world
+        x = y = world.mapWidth // 2
+        world.setCellTiles(x, y, ['floor_dungeon_1'])
+        world.addPlayer(x, y)
+
+    else:
+        GAME.levelLoader = LevelLoader()
+        level0 = GAME.levelLoader.loadNow("town3")
         GAME.currentLevel = level0
         level0.placePlayerAtPortal(level0.portals[1])
 
-        level1 = Level("mapwPIES4")
-        GAME.levels.append(level1)
-        GAME.couplePortals(level0.portals[0], level1.portals[0])
-
-        level2 = Level("mapwPIES3")
-        GAME.levels.append(level2)
-        GAME.couplePortals(level1.portals[1], level2.portals[0])
+        GAME.levelLoader.linkPortals(("town3", 0), ("mapwPIES4", 0))
+        GAME.levelLoader.linkPortals(("mapwPIES4", 1), ("mapwPIES3", 0))
 
     GAME.viewer = GAME.player 
     GAME.camera = graphics.Camera(viewer=GAME.player)
 
 
 if __name__ == "__main__":
-    initializeGame()
-
-    # import cProfile
-    # cProfile.run('mainGameLoop()')
+    parser = argparse.ArgumentParser(description="qQuest")
+    parser.add_argument('--profile', nargs='?', const='profile.csv', metavar='CSV_FILE',
+                        help="write each frame's timings, in ms, to CSV_FILE")
+    parser.add_argument('--world', type=int, metavar='SEED',
+                        help="play a generated world, made up as it is explored")
+    args = parser.parse_args()
+
+    initializeDisplay()
+    initializeGame(worldSeed=args.world)
+    if args.profile is not None:
+        PROFILER.startCsv(args.profile)
 
     mainGameLoop()#debugMode = 'spriteList')
 
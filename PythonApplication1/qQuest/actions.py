@@ -5,12 +5,18 @@ I'm not entirely sure I love this construction because its so tightly coupled
 to the Creature class but it does make the Creature class a bit easier to parse 
 through.'''
 
+import math
+
 from numpy.random import normal
 
 from qQuest import characters 
 from qQuest.game import GAME
 
 class QueueEntry():
+    # Once started, does this only count down until it completes?  If so, the
+    # actor can sleep through it; see Scheduler.
+    idles = False
+
     def __init__(self, actor: 'characters.Creature', duration: float, emoteName: str=None, **kwargs):
         self.actor = actor
         self.totalDuration = duration
@@ -26,12 +32,18 @@ class QueueEntry():
     def completed(self) -> bool:
         return self.remainingDuration <= 0
 
+    def getIdleTicks(self) -> int:
+        ''' Ticks before the one on which this completes. '''
+        return math.ceil(self.remainingDuration) - 1
+
     def execute(self) -> bool:
         ''' returns success.  Non-success means stop this current queued 
         action, completed or not.'''
         raise NotImplementedError("Must be overwritte by child class.")
 
 class QueuedWait(QueueEntry):
+    idles = True
+
     def execute(self) -> bool:
         self.tick()
         return True 
@@ -80,12 +92,14 @@ class QueuedMove(QueueEntry):
     def terminateMovement(self) -> None:
         ''' Called when movement ends.  Cleans up loose ends. 
         Or it used to, anyways.'''
-        self.actor.x = round(self.actor.graphicX)
-        self.actor.y = round(self.actor.graphicY)
+        self.actor.level.moveObject(self.actor, round(self.actor.graphicX),
+                                                round(self.actor.graphicY))
         if hasattr(self.actor,'recalculateFov'):
-            self.actor.recalculateFov()
+            self.actor.level.perception.request(self.actor)
 
 class QueuedAI(QueueEntry):
+    idles = True
+
     def execute(self) -> bool:
         self.tick()
         if self.completed:
@@ -94,6 +108,8 @@ class QueuedAI(QueueEntry):
 
 class QueuedAttack(QueueEntry):
     ''' The action of attacking and its duration. '''
+    idles = True
+
     def __init__(self, *args, target: 'characters.Combatant'=None, 
                     **kwargs):
         ''' Type  hint should actually be combatant.'''
@@ -140,6 +156,8 @@ def damageFunction(attacker: 'Combatant', target: 'Combatant'):
 
 class QueuedDamage(QueueEntry):
     ''' taking damage (interrupting), and its duration '''
+    idles = True
+
     def __init__(self, *args, dhp:-3, **kwargs):
         self.dhp = dhp
         super().__init__(*args, **kwargs)
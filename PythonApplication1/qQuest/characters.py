@@ -22,6 +22,9 @@ The Player is both a Combatant and a Viewer.
 import collections
 import itertools
 import math
+from typing import Tuple
+
+import numpy as np
 
 from qQuest import constants, actions
 from qQuest.game import GAME, GameObject
@@ -61,9 +64,12 @@ class Creature(Actor):
         from the right (.pop()), so new queue entries should be added with
         .appendleft()
         '''
+        self.storeGraphicPosition()
         if len(self.actionQueue) == 0:
             if self.ai is not None:
                 self.scheduleAI()
+            else:
+                self.level.scheduler.sleep(self) # until something is queued
             return 
 
         queueEntry = self.actionQueue.pop()
@@ -73,6 +79,8 @@ class Creature(Actor):
             return #if it didn't work, don't continue
         if not queueEntry.completed:
             self.actionQueue.append(queueEntry)
+            if queueEntry.idles:
+                self.level.scheduler.sleep(self, queueEntry)
 
     def scheduleMove(self, dx: int, dy: int, **kwargs) -> None:
         ''' Attempt to queue up a tile -> tile movement.
@@ -86,6 +94,12 @@ class Creature(Actor):
         duration = int(math.ceil(self.ticksPerMove * math.sqrt(dx**2+dy**2)))
         queueEntry = actions.QueuedMove(self, duration, dx, dy, **kwargs)
         self.actionQueue.appendleft(queueEntry)
+        self.actionsChanged()
+
+    def actionsChanged(self) -> None:
+        ''' Let the level's scheduler know, in case this creature is asleep. '''
+        if self.level is not None:
+            self.level.scheduler.wake(self)
 
     @property
     def movesInQueue(self) -> int:
@@ -95,10 +109,12 @@ class Creature(Actor):
     def scheduleAI(self, **kwargs) -> None:
         queueEntry = actions.QueuedAI(self, self.ai.thinkingDuration, **kwargs)
         self.actionQueue.appendleft(queueEntry)
+        self.actionsChanged()
 
     def scheduleWait(self, duration=5, **kwargs) -> None:
         queueEntry = actions.QueuedWait(self, duration, **kwargs)
         self.actionQueue.appendleft(queueEntry)
+        self.actionsChanged()
 
     def scheduleInteraction(self, target):
         pass
@@ -137,15 +153,38 @@ class Creature(Actor):
         
         itemList.append(corpse)
         for el in itemList:
-            GAME.currentLevel.objects.append(el)
+            self.level.addObject(el)
 
         self.dead = True
-        GAME.currentLevel.objects.remove(self)
+        self.level.removeObject(self)
+
+
+
+class StatAttribute:
+    ''' A Combatant attribute (hp, base stats) which, when set, bumps the 
+    Combatant's statsVersion.  Whatever displays stats can then tell whether 
+    it needs to redraw by checking that one number.'''
+    def __set_name__(self, owner, name):
+        self.attrName = '_' + name
 
+    def __get__(self, obj, objType=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.attrName)
+
+    def __set__(self, obj, value):
+        setattr(obj, self.attrName, value)
+        obj.statsChanged()
 
 
 class Combatant(Creature):
     ''' Combatant takes the Creature class and adds in health, attacking, etc.'''
+    hp = StatAttribute()
+    maxHp = StatAttribute()
+    baseStrength = StatAttribute()
+    baseDexterity = StatAttribute()
+    baseDefense = StatAttribute()
+
     def __init__(self, *args, deathFunction=None, 
                  hp=10, baseStrength=1, baseDexterity=1, baseDefense=1, **kwargs):
         # TODO:  DeathFunction will be by name and looked up in a lib, I think.
@@ -156,7 +195,10 @@ class Combatant(Creature):
         self.baseStrength=baseStrength
         self.baseDexterity=baseDexterity
         self.baseDefense=baseDefense
-        
+
+    def statsChanged(self) -> None:
+        ''' Note that hp, stats, or equipped items changed. '''
+        self.statsVersion = getattr(self, 'statsVersion', 0) + 1
         
     @property
     def dexterity(self):
@@ -177,6 +219,7 @@ class Combatant(Creature):
         attackDuration = 30 # inverse "attack speed"
         queueEntry = actions.QueuedAttack(self, attackDuration, target=target, **kwargs)
         self.actionQueue.appendleft(queueEntry)
+        self.actionsChanged()
 
     def scheduleDamage(self, dhp=-3, **kwargs) -> None:
         ''' Damage happening to self'''
@@ -185,6 +228,7 @@ class Combatant(Creature):
 
         # note the backwards appending here-- this interrupts
         self.actionQueue.append(queueEntry)
+        self.actionsChanged()
 
     def takeDamage(self, damage: float) -> None:
         self.hp -= damage
@@ -241,32 +285,61 @@ class Viewer(GameObject):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.explorationHistory = {}
+        self.fovWindow = None
+        self._fov = None
                 
     def recalculateFov(self) -> None:
         ''' Using the level's transparency map, recalculate what can be seen 
-        from the Viewer's coordinates'''
-        self.fov = self.level.computeFov(self.x, self.y).tolist()   
+        from the Viewer's coordinates.  Whatever can be seen now is also added
+        to the exploration history.'''
+        self.setFovWindow(*self.level.computeFovWindow(self.x, self.y))
+
+    def setFovWindow(self, origin: Tuple[int], window: np.ndarray) -> None:
+        ''' Take on a freshly computed FOV window (see Level.computeFovWindow).
+        Only the window is touched here; the map sized fov is built lazily, 
+        as only Viewers which get drawn ever need it.'''
+        self.fovWindow = (origin, window)
+        self._fov = None
+
+        self.initLevelExplorationHistory()
+        (x0, y0), (height, width) = origin, window.shape
+        self.exploredMap[y0:y0+height, x0:x0+width] |= window
+
+    @property
+    def fov(self) -> np.ndarray:
+        ''' What the Viewer can see, as a map sized boolean array [y, x].'''
+        if self._fov is None:
+            self._fov = self.level.fovFromWindow(*self.fovWindow)
+        return self._fov
 
     def getTileIsVisible(self, x: int, y: int) -> bool:
         ''' Can the Viewer see the square x, y '''
-        return self.fov[y][x]
+        (x0, y0), window = self.fovWindow
+        height, width = window.shape
+        if 0 <= x-x0 < width and 0 <= y-y0 < height:
+            return window[y-y0, x-x0]
+        return False
 
     def initLevelExplorationHistory(self) -> None:
         ''' Initialize a map which depicts, for this level, the history of
-        what the Viewer has seen.  Needed for fog of war '''
+        what the Viewer has seen.  Needed for fog of war.  It is whatever
+        kind of per cell array the level keeps (see Level.newCellMap).'''
         levelID = self.level.uniqueID
         if levelID not in self.explorationHistory.keys(): #first time visiting a level
-            self.explorationHistory[levelID] = [[False for el in row] for row in self.level.map]
+            self.explorationHistory[levelID] = self.level.newCellMap(dtype=bool, fill=False)
+
+    @property
+    def exploredMap(self) -> np.ndarray:
+        ''' The exploration history of the current level, indexed [y, x].'''
+        return self.explorationHistory[self.level.uniqueID]
 
     def setTileIsExplored(self, x: int, y: int):
         ''' Mark that the tile at (x,y) for this level has been seen by Viewer'''
-        levelID = self.level.uniqueID
-        self.explorationHistory[levelID][y][x] = True
+        self.exploredMap[y, x] = True
     
     def getTileIsExplored(self, x: int, y: int) -> bool:
         ''' Has viewer perviousy seen the tile at (x,y) for this level?'''
-        levelID = self.level.uniqueID
-        return self.explorationHistory[levelID][y][x]
+        return self.exploredMap[y, x]
 
 
 class PlayerClass(Viewer, Combatant):
@@ -287,5 +360,6 @@ class PlayerClass(Viewer, Combatant):
         duration = 10 
         queueEntry = actions.QueuedInteraction(self, duration, target=target, **kwargs)
         self.actionQueue.appendleft(queueEntry)
+        self.actionsChanged()
 
 
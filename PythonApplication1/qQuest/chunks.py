@@ -0,0 +1,413 @@
+''' Levels too big to keep in memory--or made up as they are explored--held
+a chunk at a time.
+
+A ChunkedLevel splits its map into CHUNK_SIZE x CHUNK_SIZE cell chunks, each
+with its own TileGrid.  Chunks are loaded as viewers approach them, and those
+more than CHUNK_EVICT_RADIUS chunks from every viewer are written out to disk
+and dropped.  The creatures and items on an evicted chunk are frozen along
+with it: kept as their library key, cell, and a little state, and made afresh
+when the chunk is loaded again.  However big the world, only the chunks
+around the viewers, and the actors on them, are in memory.
+
+Per cell arrays--walkable, transparent, and viewers' exploration history--
+are ChunkedArrays, which read and write like the numpy arrays of a Level.
+
+The first time a chunk is loaded, its tiles and entities come from a chunk
+source: LayoutChunkSource slices them out of a level file, and
+GeneratedChunkSource makes them up.
+'''
+
+import collections
+import json
+import os
+import tempfile
+import threading
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from qQuest import constants
+from qQuest.characters import Creature
+from qQuest.graphics import ASSETS, Actor
+from qQuest.items import Item
+from qQuest.levels import Level
+from qQuest.lib.portalLib import PORTALS
+from qQuest.tilegrid import TILE_TYPE_IDS, TileGrid, getTypeIdsByKey
+
+GENERATED_WORLD_SIZE = 2**17 # cells along each side of a generated world
+ROOM_SIZE_LIMITS = (4, 10)
+
+# Actor attributes kept when an actor is frozen, besides its key and cell.
+FROZEN_ATTRIBUTES = ('uniqueName', 'hp')
+
+
+def getChunkKey(x: int, y: int) -> Tuple[int]:
+    ''' (cx, cy) of the chunk cell (x,y) is in. '''
+    return (x // constants.CHUNK_SIZE, y // constants.CHUNK_SIZE)
+
+def iterChunkWindows(x0: int, x1: int, y0: int, y1: int) -> Iterator[tuple]:
+    ''' Split the window of cells [y0:y1, x0:x1] up by chunk.  Yields each
+    chunk's key, and the slices of the window and of the chunk which
+    overlap.'''
+    if x0 >= x1 or y0 >= y1:
+        return
+    cs = constants.CHUNK_SIZE
+    for cy in range(y0 // cs, (y1-1) // cs + 1):
+        top, bottom = max(y0, cy*cs), min(y1, (cy+1)*cs)
+        for cx in range(x0 // cs, (x1-1) // cs + 1):
+            left, right = max(x0, cx*cs), min(x1, (cx+1)*cs)
+            yield ((cx, cy),
+                   (slice(top-y0, bottom-y0), slice(left-x0, right-x0)),
+                   (slice(top-cy*cs, bottom-cy*cs), slice(left-cx*cs, right-cx*cs)))
+
+
+def makeCacheDir() -> tempfile.TemporaryDirectory:
+    return tempfile.TemporaryDirectory(prefix='qQuest-chunks-', dir=constants.CHUNK_CACHE_DIR)
+
+
+class ChunkedArray:
+    ''' A (mapHeight, mapWidth) array over a ChunkedLevel, kept a chunk at a
+    time.  Index it like a numpy array, by [y, x] for a cell or by
+    [y0:y1, x0:x1] for a window; windows read out are copies.  Touching a
+    chunk which isn't loaded loads it.'''
+    def __init__(self, level: 'ChunkedLevel', dtype: type, fill) -> None:
+        self.level = level
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        self.chunks = {} # chunk key -> array
+
+    @property
+    def shape(self) -> Tuple[int]:
+        return (self.level.mapHeight, self.level.mapWidth)
+
+    def getChunk(self, key: Tuple[int]) -> np.ndarray:
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            self.level.loadChunk(key)
+            chunk = self.chunks[key]
+        return chunk
+
+    def getWindowBounds(self, index: Tuple[slice]) -> Tuple[int]:
+        yIndex, xIndex = index
+        height, width = self.shape
+        y0, y1, _ = yIndex.indices(height)
+        x0, x1, _ = xIndex.indices(width)
+        return x0, max(x0, x1), y0, max(y0, y1)
+
+    def __getitem__(self, index: tuple):
+        y, x = index
+        if not isinstance(y, slice):
+            cs = constants.CHUNK_SIZE
+            return self.getChunk((x // cs, y // cs))[y % cs, x % cs]
+
+        x0, x1, y0, y1 = self.getWindowBounds(index)
+        window = np.empty((y1-y0, x1-x0), dtype=self.dtype)
+        for key, windowSlices, chunkSlices in iterChunkWindows(x0, x1, y0, y1):
+            window[windowSlices] = self.getChunk(key)[chunkSlices]
+        return window
+
+    def __setitem__(self, index: tuple, value) -> None:
+        y, x = index
+        if not isinstance(y, slice):
+            cs = constants.CHUNK_SIZE
+            self.getChunk((x // cs, y // cs))[y % cs, x % cs] = value
+            return
+
+        x0, x1, y0, y1 = self.getWindowBounds(index)
+        value = np.broadcast_to(value, (y1-y0, x1-x0))
+        for key, windowSlices, chunkSlices in iterChunkWindows(x0, x1, y0, y1):
+            self.getChunk(key)[chunkSlices] = value[windowSlices]
+
+
+class Chunk:
+    def __init__(self, tileGrid: TileGrid) -> None:
+        self.tileGrid = tileGrid
+        self.tilesVersion = 0
+
+    @property
+    def shape(self) -> Tuple[int]:
+        return (self.tileGrid.height, self.tileGrid.width)
+
+
+class LayoutChunkSource:
+    ''' Chunks sliced out of a LevelLayout.  From a memory-mapped .lvlb (see
+    levelfile.loadLevelLayout), only the parts of the file a chunk covers are
+    ever read.  Portals are placed up front rather than chunk by chunk, as
+    other levels' portals lead to them.'''
+    def __init__(self, layout: 'levelfile.LevelLayout') -> None:
+        self.layout = layout
+        self.width, self.height = layout.width, layout.height
+        self.typeIdsByKey = getTypeIdsByKey(layout.keys)
+
+        self.portals = []
+        self.entitiesByChunk = collections.defaultdict(list)
+        for x, y, keyIdx in layout.entities.tolist():
+            entity = (x, y, layout.keys[keyIdx])
+            if entity[2] in PORTALS:
+                self.portals.append(entity)
+            else:
+                self.entitiesByChunk[getChunkKey(x, y)].append(entity)
+
+    def getChunk(self, key: Tuple[int]) -> Tuple[np.ndarray, List[tuple]]:
+        ''' The tile type ids of chunk key, (numLayers, height, width), and
+        the (x, y, libKey) entities on it.'''
+        cs = constants.CHUNK_SIZE
+        cx, cy = key
+        layers = self.layout.layers[:, cy*cs:(cy+1)*cs, cx*cs:(cx+1)*cs]
+        return self.typeIdsByKey[layers], self.entitiesByChunk.get(key, [])
+
+
+class GeneratedChunkSource:
+    ''' A world of width x height cells, made up a chunk at a time as it is
+    first visited: open floor, scattered with walled rooms that have a door
+    in each wall, and a few creatures and items.  Rooms keep off the edges
+    of their chunk, so the floor between them always joins up.  The same
+    seed always makes the same world.'''
+    def __init__(self, seed: int=0, width: int=GENERATED_WORLD_SIZE,
+                 height: int=GENERATED_WORLD_SIZE, floorKey: str='floor_dungeon_1',
+                 wallKey: str='wall_dungeon_1',
+                 entityKeys: Tuple[str]=('jelly', 'slime', 'healingPotion'),
+                 roomsPerChunk: int=3, entitiesPerChunk: int=4) -> None:
+        self.seed = seed
+        self.width, self.height = width, height
+        self.floorId = TILE_TYPE_IDS[floorKey]
+        self.wallId = TILE_TYPE_IDS[wallKey]
+        self.entityKeys = entityKeys
+        self.roomsPerChunk = roomsPerChunk
+        self.entitiesPerChunk = entitiesPerChunk
+        self.portals = []
+
+    def getChunk(self, key: Tuple[int]) -> Tuple[np.ndarray, List[tuple]]:
+        cs = constants.CHUNK_SIZE
+        cx, cy = key
+        x0, y0 = cx*cs, cy*cs
+        width, height = min(cs, self.width-x0), min(cs, self.height-y0)
+        rng = np.random.default_rng((self.seed, cx, cy))
+
+        floor, wall = self.floorId, self.wallId
+        tiles = np.full((height, width), floor, dtype=np.uint16)
+        for _ in range(self.roomsPerChunk):
+            roomWidth, roomHeight = rng.integers(ROOM_SIZE_LIMITS[0], ROOM_SIZE_LIMITS[1]+1, size=2)
+            if roomWidth > width-2 or roomHeight > height-2:
+                continue
+            left = int(rng.integers(1, width-roomWidth))
+            top = int(rng.integers(1, height-roomHeight))
+            right, bottom = left+roomWidth-1, top+roomHeight-1
+            tiles[[top, bottom], left:right+1] = wall
+            tiles[top:bottom+1, [left, right]] = wall
+            tiles[[top, bottom], left+roomWidth//2] = floor
+            tiles[top+roomHeight//2, [left, right]] = floor
+
+        # the world itself is walled in
+        if x0 == 0:
+            tiles[:, 0] = wall
+        if y0 == 0:
+            tiles[0, :] = wall
+        if x0+width == self.width:
+            tiles[:, -1] = wall
+        if y0+height == self.height:
+            tiles[-1, :] = wall
+
+        floorCells = np.argwhere(tiles == floor)
+        numEntities = int(rng.integers(0, min(self.entitiesPerChunk, len(floorCells))+1))
+        picks = rng.choice(len(floorCells), size=numEntities, replace=False)
+        entities = [(x0+int(x), y0+int(y), str(rng.choice(self.entityKeys)))
+                    for y, x in floorCells[picks]]
+        return tiles[np.newaxis], entities
+
+
+class ChunkedLevel(Level):
+    ''' A Level whose map is only ever partly in memory (see the top of this
+    module).  Its chunks come from source, by default a LayoutChunkSource
+    of levels/levelName.lvlb.
+
+    Only actors spawned from a library key get frozen.  The player, portals,
+    and anything dropped or left behind in play stay loaded.'''
+    def __init__(self, levelName: str, source=None) -> None:
+        self.chunks = {}          # chunk key -> Chunk, for loaded chunks
+        self.cellMaps = []        # ChunkedArrays, loaded and evicted along with the chunks
+        self.libKeys = {}         # actor -> library key, for actors which can be frozen
+        self.viewerChunks = None  # chunks the viewers were on at the last updateChunks
+        self.numKeptChunks = 0    # chunks loaded after the last updateChunks
+        self.chunkLock = threading.RLock() # chunks load on demand, FOV workers included
+        self.cacheDir = makeCacheDir()     # evicted chunks
+        super().__init__(levelName, loadFromFile=False)
+
+        if source is None:
+            self.loadLevelFile()
+            source = LayoutChunkSource(self.layout)
+        self.source = source
+        self.mapWidth, self.mapHeight = source.width, source.height
+
+        self.walkable = self.newCellMap(dtype=bool, fill=False)
+        self.transparent = self.newCellMap(dtype=bool, fill=True)
+        for x, y, libKey in source.portals:
+            self.addEntity(x, y, libKey)
+        self.initializeVisibilityMap()
+
+    def __getstate__(self) -> dict:
+        ''' Locks don't pickle, and the cache directory goes when the game
+        does, so evicted chunks are kept in the saved game instead.'''
+        with self.chunkLock:
+            state = self.__dict__.copy()
+            evictedChunks = {}
+            for fileName in os.listdir(self.cacheDir.name):
+                with open(os.path.join(self.cacheDir.name, fileName), 'rb') as f:
+                    evictedChunks[fileName] = f.read()
+        del state['chunkLock'], state['cacheDir']
+        state['evictedChunks'] = evictedChunks
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        evictedChunks = state.pop('evictedChunks')
+        self.__dict__.update(state)
+        self.chunkLock = threading.RLock()
+        self.cacheDir = makeCacheDir()
+        for fileName, chunkBytes in evictedChunks.items():
+            with open(os.path.join(self.cacheDir.name, fileName), 'wb') as f:
+                f.write(chunkBytes)
+
+    def newCellMap(self, dtype: type=bool, fill=False) -> ChunkedArray:
+        with self.chunkLock:
+            cellMap = ChunkedArray(self, dtype, fill)
+            for key, chunk in self.chunks.items():
+                cellMap.chunks[key] = np.full(chunk.shape, fill, dtype=dtype)
+            self.cellMaps.append(cellMap)
+        return cellMap
+
+    def initializeVisibilityMap(self) -> None:
+        ''' There's no libtcod map of the whole level.  FOV windows are read
+        straight out of self.transparent, a chunk at a time.'''
+        self.initializeFovCache()
+
+    def addEntity(self, x: int, y: int, libKey: str) -> Actor:
+        actor = super().addEntity(x, y, libKey)
+        if isinstance(actor, (Creature, Item)):
+            self.libKeys[actor] = libKey
+        return actor
+
+    def removeObject(self, item: Actor) -> None:
+        super().removeObject(item)
+        self.libKeys.pop(item, None)
+
+    def getChunkFileName(self, key: Tuple[int]) -> str:
+        return os.path.join(self.cacheDir.name, f'{key[0]}_{key[1]}.npz')
+
+    def loadChunk(self, key: Tuple[int]) -> Chunk:
+        ''' Chunk key, loaded if need be: back from disk if it was evicted,
+        otherwise from the source.'''
+        with self.chunkLock:
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                return chunk
+
+            fileName = self.getChunkFileName(key)
+            if os.path.exists(fileName):
+                with np.load(fileName) as saved:
+                    saved = dict(saved)
+                tileGrid = TileGrid(saved.pop('typeIds'))
+                frozenActors = json.loads(str(saved.pop('actors')))
+            else:
+                typeIds, entities = self.source.getChunk(key)
+                tileGrid = TileGrid(typeIds)
+                frozenActors = [{'libKey': libKey, 'x': x, 'y': y} for x, y, libKey in entities]
+                saved = {}
+
+            chunk = Chunk(tileGrid)
+            self.chunks[key] = chunk
+            for idx, cellMap in enumerate(self.cellMaps):
+                cellMapChunk = saved.get(f'cellMap{idx}')
+                if cellMapChunk is None:
+                    cellMapChunk = np.full(chunk.shape, cellMap.fill, dtype=cellMap.dtype)
+                cellMap.chunks[key] = cellMapChunk
+            if not saved: # fresh from the source
+                self.walkable.chunks[key] = ~tileGrid.getBlocking()
+                self.transparent.chunks[key] = tileGrid.getSeeThru()
+
+            for frozen in frozenActors:
+                self.thawActor(frozen)
+            self.tilesVersion += 1
+            return chunk
+
+    def evictChunk(self, key: Tuple[int]) -> None:
+        ''' Write chunk key, and the actors on it, out to disk and let go of
+        them.'''
+        with self.chunkLock:
+            frozenActors = [self.freezeActor(actor) for actor in self.getChunkActors(key)]
+            chunk = self.chunks.pop(key)
+            cellMapChunks = {f'cellMap{idx}': cellMap.chunks.pop(key)
+                             for idx, cellMap in enumerate(self.cellMaps)}
+            np.savez(self.getChunkFileName(key), typeIds=chunk.tileGrid.typeIds,
+                     actors=np.array(json.dumps(frozenActors)), **cellMapChunks)
+            ASSETS.forgetCompiledLevelMap(self, key)
+            self.tilesVersion += 1
+
+    def getChunkActors(self, key: Tuple[int]) -> List[Actor]:
+        ''' The actors on chunk key which can be frozen. '''
+        return [actor for coords, cellActors in self.objectsByCoords.items()
+                if getChunkKey(*coords) == key
+                for actor in cellActors if actor in self.libKeys]
+
+    def freezeActor(self, actor: Actor) -> dict:
+        ''' Take actor out of the level, returning what it takes to make it
+        again (see thawActor).'''
+        frozen = {'libKey': self.libKeys[actor], 'x': int(actor.x), 'y': int(actor.y)}
+        frozen.update({attr: getattr(actor, attr) for attr in FROZEN_ATTRIBUTES
+                       if hasattr(actor, attr)})
+        self.removeObject(actor)
+        return frozen
+
+    def thawActor(self, frozen: dict) -> Actor:
+        actor = self.addEntity(frozen['x'], frozen['y'], frozen['libKey'])
+        for attr in FROZEN_ATTRIBUTES:
+            if attr in frozen and actor is not None:
+                setattr(actor, attr, frozen[attr])
+        return actor
+
+    def updateChunks(self) -> None:
+        ''' Load the chunks around each viewer, and evict those far from all
+        of them.  Nothing is done unless a viewer has moved onto another chunk,
+        or more chunks were loaded on demand since last time.'''
+        viewerChunks = {getChunkKey(viewer.x, viewer.y) for viewer in self.viewers}
+        if viewerChunks == self.viewerChunks and len(self.chunks) <= self.numKeptChunks:
+            return
+
+        evictRadius = constants.CHUNK_EVICT_RADIUS
+        keep = {(cx+dx, cy+dy) for cx, cy in viewerChunks
+                for dx in range(-evictRadius, evictRadius+1)
+                for dy in range(-evictRadius, evictRadius+1)}
+        for key in [key for key in self.chunks if key not in keep]:
+            self.evictChunk(key)
+
+        cs, loadRadius = constants.CHUNK_SIZE, constants.CHUNK_LOAD_RADIUS
+        for cx, cy in viewerChunks:
+            for key in [(cx+dx, cy+dy) for dy in range(-loadRadius, loadRadius+1)
+                        for dx in range(-loadRadius, loadRadius+1)]:
+                if 0 <= key[0]*cs < self.mapWidth and 0 <= key[1]*cs < self.mapHeight:
+                    self.loadChunk(key)
+
+        self.viewerChunks = viewerChunks
+        self.numKeptChunks = len(self.chunks)
+
+    def getTileGridPieces(self, xRange: range, yRange: range) -> List[tuple]:
+        ''' The loaded chunks, each its own piece. '''
+        cs = constants.CHUNK_SIZE
+        pieces = []
+        for key, _, _ in iterChunkWindows(xRange.start, xRange.stop, yRange.start, yRange.stop):
+            chunk = self.loadChunk(key)
+            pieces.append((key, (key[0]*cs, key[1]*cs), chunk.tileGrid, chunk.tilesVersion))
+        return pieces
+
+    def setCellTiles(self, x: int, y: int, tileTypeKeys: List[str]) -> None:
+        key = getChunkKey(x, y)
+        chunk = self.loadChunk(key)
+        cellX, cellY = x - key[0]*constants.CHUNK_SIZE, y - key[1]*constants.CHUNK_SIZE
+        chunk.tileGrid.setCellKeys(cellX, cellY, tileTypeKeys)
+        chunk.tilesVersion += 1
+        self.tilesVersion += 1
+        self.setCellFlags(x, y, walkable=not chunk.tileGrid.isBlocking(cellX, cellY),
+                          transparent=chunk.tileGrid.isSeeThru(cellX, cellY))
+
+    def takeCreatureTurns(self) -> None:
+        self.updateChunks()
+        super().takeCreatureTurns()
@@ -36,6 +36,14 @@ COLOR_DEFAULT_BG = COLOR_GREY
 #TODO:  change to pygame.font.match_font(), remove fonts folder
 FONT_CONSOLA = pygame.font.Font(pygame.font.match_font('consola'), 14)
 FONT_DEBUG = FONT_CONSOLA
+TEXT_CACHE_SIZE = 512 # rendered strings kept around, see graphics.renderText
+
+''' Sprites '''
+# Packed sprite atlas, kept between runs (relative to the asset root).  
+# None packs it from the sheets on every launch.
+SPRITE_CACHE_FILE = None
+# Memory allowed for cut animations and loaded sheets, in bytes.
+ASSET_CACHE_BUDGET = 16 * 1024 * 1024
 
 
 ''' FOV stuff '''
@@ -43,12 +51,42 @@ import tcod as libtcod
 FOV_ALGO = libtcod.FOV_BASIC  # Algorithm for FOV Calculation
 FOV_LIGHT_WALLS = True        # Does the FOV shine on the walls?
 FOV_RADIUS = 10             # Sight radius for FOV
+FOV_CACHE_SIZE = 256          # FOV windows remembered per level
+FOV_WORKERS = 0               # threads for batched FOV; 0 computes inline
+
+''' Chunked levels, see chunks.py '''
+CHUNK_SIZE = 32               # cells along each side of a chunk
+CHUNK_LOAD_RADIUS = 1         # chunks kept loaded around each viewer's own
+CHUNK_EVICT_RADIUS = 2        # chunks further away than this go to disk
+CHUNK_CACHE_DIR = None        # where evicted chunks go; None for a temp dir
+
+''' Level loading, see levelloader.py '''
+LEVEL_LOADER_WORKERS = 1      # threads building levels; 0 builds them inline
+LEVEL_PREFETCH_RADIUS = 8     # cells from a portal at which its level loads
 
 ''' message window stuff '''
 NUM_GAME_MESSAGES = 4
 
 GAME_FPS = 60
 
+# The simulation runs at a fixed rate, whatever the frame rate.  Durations
+# (ticksPerMove, attacks, AI thinking) are counted in these ticks.  If drawing
+# falls far behind, at most MAX_TICKS_PER_FRAME are caught up per frame.
+SIMULATION_FPS = 60
+MAX_TICKS_PER_FRAME = 5
+
+# Only redraw the parts of the screen that change.  Easier on slow hardware.
+DIRTY_RECT_RENDERING = False
+
+# Show the asset cache's memory use and hit/miss/eviction counts by the fps.
+SHOW_ASSET_CACHE_STATS = False
+
+# Frame profiler: frames kept for its percentiles, and how often the overlay
+# (toggled with PROFILER_KEY) re-reads them.
+PROFILER_WINDOW = 300
+PROFILER_REFRESH_MS = 500
+PROFILER_KEY = pygame.K_F3
+
 CLOCK = pygame.time.Clock()
 
 
@@ -16,6 +16,8 @@ class Game:
 
         self.levels = []
         self.currentLevel = None
+        self.levelLoader = None   # see levelloader.py
+        self.awaitedPortal = None # entered before its level was ready
 
         self.player = None
         self.camera = None
@@ -27,6 +29,8 @@ class Game:
     def transitPortal(self, entryPortal: 'level.Portal') -> None:
         destinationPortal = entryPortal.destinationPortal
         if destinationPortal is None:
+            if self.levelLoader is not None and self.levelLoader.isLinked(entryPortal):
+                self.awaitedPortal = entryPortal # see updateLevels
             return
         newLevel = destinationPortal.level
 
@@ -36,6 +40,21 @@ class Game:
         self.viewer.recalculateFov()
         self.camera.updatePositionFromViewer()
 
+    def updateLevels(self) -> None:
+        ''' Once a frame: let the level loader get on, and go through a portal
+        whose level wasn't ready when it was entered, once it is--as long as 
+        the player is still standing on it.'''
+        if self.levelLoader is None:
+            return
+        self.levelLoader.update(self.player)
+
+        portal = self.awaitedPortal
+        if portal is None or portal.destinationPortal is None:
+            return
+        self.awaitedPortal = None
+        if self.player.level is portal.level and (self.player.x, self.player.y) == (portal.x, portal.y):
+            self.transitPortal(portal)
+
     @staticmethod
     def couplePortals(portal0: 'level.Portal', portal1: 'level.Portal')->None:
         ''' Symmetrically configure two portals. '''
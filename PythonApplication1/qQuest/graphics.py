@@ -2,12 +2,22 @@
 
 '''
 
+import collections
 import copy
 import itertools
+import json
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
 from collections import namedtuple
 from functools import lru_cache
 from typing import Callable, Dict, List, Tuple
 
+import numpy as np
 import pygame
 from pygame.locals import DOUBLEBUF, FULLSCREEN
 
@@ -16,11 +26,39 @@ try:
     from qQuest.constants import CLOCK #, GAME
     from qQuest.game import GameObject
     from qQuest.lib.visEffectsLib import EFFECTS
+    from qQuest.profiler import PROFILER
+    from qQuest.tilegrid import TILE_DEPTHS, TILE_SPRITE_DICTS
 except ImportError:
     import constants
     from constants import CLOCK #, GAME
     from game import GameObject
     from lib.visEffectsLib import EFFECTS   
+    from profiler import PROFILER
+    from tilegrid import TILE_DEPTHS, TILE_SPRITE_DICTS
+
+
+''' Fog of war.  Neighbor bits, used to pick the ragged edge sprites, and how
+dark explored-but-not-visible cells get.'''
+FOW_ABOVE, FOW_RIGHT, FOW_BELOW, FOW_LEFT = 1, 2, 4, 8
+FOW_DARKENED_ALPHA = 200
+FOW_SURFACE = None # reused per-pixel alpha surface, made on first use.
+FOW_EDGE_SPRITES = {} # (neighborMask, alpha) -> Surface, see buildFowEdgeSprites
+
+SCREEN_GENERATION = 0 # see invalidateScreen
+
+''' How far the simulation has got towards its next tick, 0 to 1, when a frame
+is drawn.  Actors are drawn that far between where they were before the last
+tick and where they are now; see Actor.getInterpolatedPosition.'''
+INTERPOLATION = 1.0
+
+''' Cells around the camera window whose actors are still considered for
+drawing: one mid-step, or its emote, can reach into the window.'''
+CULL_BORDER = 2
+
+CHYRON_SURFACE = None # the rendered chyron, see drawChyron
+CHYRON_KEY = None
+MESSAGE_LOG_SURFACE = None # the rendered recent messages, see drawGameMessages
+MESSAGE_LOG_KEY = None
 
 
 class Camera:
@@ -36,8 +74,7 @@ class Camera:
         ''' Recenter the camera on a Viewer instance.  The position here is
         stored in units of cells, not pixels, and can be a float.'''
         if self.viewer is not None:
-            self.x = self.viewer.graphicX 
-            self.y = self.viewer.graphicY 
+            self.x, self.y = self.viewer.getInterpolatedPosition()
 
     def canSee(self, x: int, y: int) -> bool:
         ''' Is coordinate (x,y), in cells, in sight of the camera?'''
@@ -48,6 +85,18 @@ class Camera:
         yVisible = (y < self.y+h) and (y > self.y-h)
         return xVisible and yVisible
 
+    def getVisibleCellRanges(self, mapWidth: int, mapHeight: int) -> Tuple[range]:
+        ''' The x and y ranges of cells which land (at least partly) inside the
+        camera window, clipped to the map.  At most (CAMERA_WIDTH+1) x 
+        (CAMERA_HEIGHT+1) cells, however big the map is.'''
+        w = constants.CAMERA_WIDTH
+        h = constants.CAMERA_HEIGHT
+        xRange = range(max(0, math.floor(self.x - w/2 - 0.5) + 1),
+                       min(mapWidth, math.ceil(self.x + w/2 + 0.5)))
+        yRange = range(max(0, math.floor(self.y - h/2 - 0.5) + 1),
+                       min(mapHeight, math.ceil(self.y + h/2 + 0.5)))
+        return xRange, yRange
+
     def drawPosition(self, x: int, y: int) -> Tuple[int]:
         '''Converts a game map position to a draw position, both still in units 
         of cells.'''
@@ -55,22 +104,24 @@ class Camera:
         h = constants.CAMERA_HEIGHT
         return (x - self.x + w/2 - 0.5, y - self.y + h/2 - 0.5)
  
-    # def getUpperLeftCorner(self) -> Tuple[float]:
-    #     ''' Returned in pixels '''
-    #     w = constants.CAMERA_WIDTH
-    #     h = constants.CAMERA_HEIGHT 
+    def getUpperLeftCorner(self) -> Tuple[int]:
+        ''' Where the top left of the camera window sits on the level, in pixels.
+        Rounded the same way drawPosition() results are, so the two line up.'''
+        w = constants.CAMERA_WIDTH
+        h = constants.CAMERA_HEIGHT 
 
-    #     xDrawingPos = (self.x-w/2+w)*constants.CELL_WIDTH
-    #     yDrawingPos = (self.y-h/2+h)*constants.CELL_HEIGHT
-    #     return (xDrawingPos, yDrawingPos)
+        xDrawingPos = round((self.x - w/2 + 0.5)*constants.CELL_WIDTH)
+        yDrawingPos = round((self.y - h/2 + 0.5)*constants.CELL_HEIGHT)
+        return (xDrawingPos, yDrawingPos)
 
-    # def getViewingRect(self) -> pygame.Rect:
-    #     w = constants.CAMERA_WIDTH
-    #     h = constants.CAMERA_HEIGHT
-    #     map_rect = pygame.Rect(*self.getUpperLeftCorner(),
-    #                            w*constants.CELL_WIDTH,
-    #                            h*constants.CELL_HEIGHT)
-    #     return map_rect      
+    def getViewingRect(self) -> pygame.Rect:
+        ''' The window of the level, in pixels, that the camera draws.'''
+        w = constants.CAMERA_WIDTH
+        h = constants.CAMERA_HEIGHT
+        map_rect = pygame.Rect(*self.getUpperLeftCorner(),
+                               w*constants.CELL_WIDTH,
+                               h*constants.CELL_HEIGHT)
+        return map_rect      
 
 
 class SpriteSheet:
@@ -117,6 +168,9 @@ class SpriteSheet:
 class Actor(GameObject):
     ''' This base class is used for everything that will be drawn on the screen.
     '''
+    lastGraphicX = None # graphicX/Y before the last simulation tick
+    lastGraphicY = None
+
     def __init__(self, *args, spriteDict=None, animationSpeed=0.5, depth=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.resyncGraphicPosition()
@@ -133,14 +187,28 @@ class Actor(GameObject):
         # X and Y are ints and represent grid locations for most logic purposes
         # graphicX and graphicY are where the sprite is drawn, and can be floats.
         self.graphicX, self.graphicY = copy.copy(self.x), copy.copy(self.y)
+        self.storeGraphicPosition()
+
+    def storeGraphicPosition(self) -> None:
+        ''' Remember where the Actor is drawn, ahead of a simulation tick. '''
+        self.lastGraphicX, self.lastGraphicY = self.graphicX, self.graphicY
+
+    def getInterpolatedPosition(self) -> Tuple[float]:
+        ''' Where to draw the Actor: INTERPOLATION of the way from its graphic
+        position before the last simulation tick to the current one.'''
+        if INTERPOLATION >= 1.0 or self.lastGraphicX is None:
+            return self.graphicX, self.graphicY
+        return (self.lastGraphicX + (self.graphicX - self.lastGraphicX) * INTERPOLATION,
+                self.lastGraphicY + (self.graphicY - self.lastGraphicY) * INTERPOLATION)
 
     @property
     def animation(self) -> List[pygame.Surface]:
         return ASSETS[self.spriteDict]
 
     def getCurrentSprite(self) -> pygame.Surface:
-        if len(self.animation) == 1:
-            return self.animation[0]
+        animation = self.animation
+        if len(animation) == 1:
+            return animation[0]
         
         if CLOCK.get_fps() > 0.0:
             self.flickerTimer += 1/CLOCK.get_fps() 
@@ -149,9 +217,9 @@ class Actor(GameObject):
             self.flickerTimer = 0
             self.spriteImageNum += 1
                 
-            if self.spriteImageNum >= len(self.animation): #modulo
+            if self.spriteImageNum >= len(animation): #modulo
                 self.spriteImageNum = 0
-        return self.animation[self.spriteImageNum]
+        return animation[self.spriteImageNum]
 
     def draw(self, surface: pygame.Surface,
                    viewer: 'creatures.Viewer'=None,
@@ -160,104 +228,200 @@ class Actor(GameObject):
         ''' Blits the Actor's current sprite in the appropriate location
         on the relevant surface.
         drawHistory means rather than assessing if a viewer can see it now, we assess whether a viewer has ever seen it. '''
+        for sprite, position in self.getBlits(viewer, camera, drawHistory):
+            surface.blit(sprite, position)
+
+    def getBlits(self, viewer: 'creatures.Viewer'=None,
+                       camera: 'graphics.Camera'=None,
+                       drawHistory: bool=False) -> List[Tuple[pygame.Surface, Tuple[int]]]:
+        ''' The (sprite, position) pairs which draw() would blit: the current 
+        sprite, and the emote above it if there is one.  Empty if the Actor
+        can't be seen.  This advances the animation, so call it once a frame.'''
+        blits = []
+        self.addBlits(blits, viewer, camera, drawHistory)
+        return blits
+
+    def addBlits(self, blits: list, viewer: 'creatures.Viewer'=None,
+                       camera: 'graphics.Camera'=None,
+                       drawHistory: bool=False) -> None:
+        ''' getBlits(), appended straight onto blits, say a whole layer's.'''
         if viewer is not None:
             if drawHistory:
                 doDraw = viewer.getTileIsExplored(self.x, self.y)
             else:
                 doDraw = viewer.getTileIsVisible(self.x, self.y)
             if not doDraw:
-                return 
+                return
 
         if camera is not None:
             if not camera.canSee(self.x, self.y):
-                return        
-            drawX, drawY = camera.drawPosition(self.graphicX, self.graphicY)
+                return
+            drawX, drawY = camera.drawPosition(*self.getInterpolatedPosition())
         else:
             drawX, drawY = self.x, self.y
 
         position = (round(drawX * constants.CELL_WIDTH), 
                     round(drawY * constants.CELL_HEIGHT)) 
         
-        currentSprite = self.getCurrentSprite()
-        surface.blit(currentSprite, position)
-        self.addGraphicEffect(surface, position)
+        blits.append((self.getCurrentSprite(), position))
+        graphicEffect = self.getGraphicEffect(position)
+        if graphicEffect is not None:
+            blits.append(graphicEffect)
 
-    def addGraphicEffect(self, surface, pos, effectName: str=None, 
+    def getGraphicEffect(self, pos, effectName: str=None, 
                             relPos: Tuple[int]=(0, -16)):
+        ''' (sprite, position) of the active emote, if any. '''
         if getattr(self, 'activeEmote', None) is None: 
-            return
+            return None
         drawPos = pos[0]+relPos[0], pos[1]+relPos[1]
         effectSprite = ASSETS[EFFECTS[self.activeEmote]['spriteDict']][0] #no animations here, now
-        surface.blit(effectSprite, drawPos)
+        return effectSprite, drawPos
         
 
+def compileBackgroundTiles(tileGrid: 'tilegrid.TileGrid') -> pygame.Surface:
+    ''' Pre-render every tile of a TileGrid (a whole level, or a chunk of one)
+    onto a single surface.  Tiles don't move, so this is drawn once and then 
+    reused every frame--the fog of war takes care of hiding whatever hasn't
+    been explored.  Animated tiles are frozen on their first frame.  Each tile
+    type is blitted in one batch per layer.'''
+    background = pygame.Surface((tileGrid.width*constants.CELL_WIDTH, 
+                                 tileGrid.height*constants.CELL_HEIGHT)).convert()
+    background.fill(constants.COLOR_BLACK)
+
+    typeIds = tileGrid.typeIds
+    for depth in constants.DEPTHS:
+        for layer in typeIds:
+            for typeId in np.unique(layer):
+                if typeId == 0 or TILE_DEPTHS[typeId] != depth:
+                    continue
+                sprite = ASSETS[TILE_SPRITE_DICTS[typeId]][0]
+                ys, xs = np.nonzero(layer == typeId)
+                background.blits([(sprite, (x*constants.CELL_WIDTH, y*constants.CELL_HEIGHT))
+                                  for x, y in zip(xs.tolist(), ys.tolist())], doreturn=False)
+    return background
+
+def drawBackground(surface: pygame.Surface, level: 'levels.Level', 
+                   camera: Camera) -> None:
+    ''' Blit the part of the level's compiled background the camera can see,
+    piece by piece (see Level.getTileGridPieces).'''
+    viewRect = camera.getViewingRect()
+    xRange, yRange = camera.getVisibleCellRanges(level.mapWidth, level.mapHeight)
+    for pieceKey, (cellX, cellY), tileGrid, tilesVersion in level.getTileGridPieces(xRange, yRange):
+        background = ASSETS.getCompiledLevelMap(level, pieceKey, tileGrid, tilesVersion)
+        pieceRect = background.get_rect(topleft=(cellX*constants.CELL_WIDTH,
+                                                 cellY*constants.CELL_HEIGHT))
+        sourceRect = viewRect.clip(pieceRect)
+        destination = (sourceRect.x - viewRect.x, sourceRect.y - viewRect.y)
+        surface.blit(background, destination, sourceRect.move(-pieceRect.x, -pieceRect.y))
+
 def drawFogOfWar(surface: pygame.Surface, level: 'levels.Level', 
                  camera: 'graphics.Camera', viewer: 'creatures.Viewer') -> None:
-    ''' Draws the fog of war.  Importantly-- also updates the Viewer's
-    seen status. '''
-
-    # this looping is dumb, we should be looping over the camera range instead of
-    # the whole map.
-        #     w = constants.CAMERA_WIDTH
-        # h = constants.CAMERA_HEIGHT
-
-        # xVisible = (x < self.x+w) and (x > self.x-w) 
-        # yVisible = (y < self.y+h) and (y > self.y-h)
-
-    mapHeight = len(level.map)
-    mapWidth = len(level.map[0])
-    for (x, y) in itertools.product(range(mapWidth), range(mapHeight)):
-
-        if not camera.canSee(x, y):
-            continue
-        drawX, drawY = camera.drawPosition(x, y)
-        tilePosition = (round(drawX*constants.CELL_WIDTH), 
-                        round(drawY*constants.CELL_HEIGHT))
-
-        tileIsVisibleToViewer = viewer.getTileIsVisible(x, y)
-        tileIsExplored = viewer.getTileIsExplored(x, y)
-        if tileIsVisibleToViewer:
-            viewer.setTileIsExplored(x, y)
-            tileIsExplored = True
-        else: 
-            # can't see the tile-- it should be blacked entirely or darkened
-            blankTile = pygame.Surface((constants.CELL_WIDTH, constants.CELL_HEIGHT))
-            blankTile.fill(constants.COLOR_BLACK)
- 
-            if tileIsExplored:
-                blankTile.set_alpha(200) # only darken
-            surface.blit(blankTile, tilePosition)
-            
-        # If the cell has never been seen, we're done.  If not, we may need to
-        # add some ragged edges.
-        if not tileIsExplored:
-            continue
-
-        # First the blacked ragged edges surrounding explored space.
-        fowSprite = getFowEdgeSprite(x, y, (mapWidth, mapHeight),                                                       viewer.getTileIsExplored)
-        if fowSprite is not None:
-            surface.blit(fowSprite, tilePosition)
-
-        # Then the darkened edges around currently visible space
-        if not tileIsVisibleToViewer:
-            continue
-        fowSprite = getFowEdgeSprite(x, y, (mapWidth, mapHeight),                                                           viewer.getTileIsVisible)
-        if fowSprite is not None:
-            fowSprite.set_alpha(200)
-            #print('drawing transparent edge')
+    ''' Draws the fog of war.  Only the cells inside the camera window are 
+    visited, and everything is worked out on boolean arrays covering that 
+    window.'''
+    xRange, yRange = camera.getVisibleCellRanges(level.mapWidth, level.mapHeight)
+    if len(xRange) == 0 or len(yRange) == 0:
+        return
+
+    # window arrays have a one cell border, so every cell has four neighbors.
+    fovOrigin, fovWindow = viewer.fovWindow
+    visible = getPaddedWindow(fovWindow, xRange, yRange, origin=fovOrigin)
+    explored = getPaddedWindow(viewer.exploredMap, xRange, yRange)
+    inner = (slice(1, -1), slice(1, -1))
+
+    drawX, drawY = camera.drawPosition(xRange.start, yRange.start)
+    origin = (round(drawX*constants.CELL_WIDTH), round(drawY*constants.CELL_HEIGHT))
+
+    # can't see the tile-- it should be blacked entirely or darkened
+    alpha = np.where(visible[inner], 0, 
+                     np.where(explored[inner], FOW_DARKENED_ALPHA, 255))
+    drawFogDarkening(surface, alpha.astype(np.uint8), origin)
+
+    # First the blacked ragged edges surrounding explored space, then the 
+    # darkened edges around currently visible space.
+    for edgeTest, edgeAlpha in ((explored, None), (visible, FOW_DARKENED_ALPHA)):
+        neighborMasks = getNotVisibleNeighborMasks(edgeTest)
+        neighborMasks[~edgeTest[inner]] = 0
+        for (y, x) in zip(*np.nonzero(neighborMasks)):
+            fowSprite = getFowEdgeSprite(neighborMasks[y, x], alpha=edgeAlpha)
+            tilePosition = (origin[0] + x*constants.CELL_WIDTH,
+                            origin[1] + y*constants.CELL_HEIGHT)
             surface.blit(fowSprite, tilePosition)
 
-def getFowEdgeSprite(x: int, y: int, limits: Tuple[int],
-                 testFunction: Callable[[int,int], bool]) -> None:
+def getPaddedWindow(grid: np.ndarray, xRange: range, yRange: range,
+                    origin: Tuple[int]=(0, 0)) -> np.ndarray:
+    ''' Copy of the boolean grid[y, x] over the window, plus a one cell border.
+    grid needn't cover the whole map: origin is the cell of its upper left 
+    corner.  Cells which fall off the grid are False.'''
+    gridX, gridY = origin
+    gridHeight, gridWidth = grid.shape
+    window = np.zeros((len(yRange)+2, len(xRange)+2), dtype=bool)
+
+    x0, x1 = max(gridX, xRange.start-1), min(gridX+gridWidth, xRange.stop+1)
+    y0, y1 = max(gridY, yRange.start-1), min(gridY+gridHeight, yRange.stop+1)
+    if x0 >= x1 or y0 >= y1:
+        return window
+    offsetX, offsetY = x0 - (xRange.start-1), y0 - (yRange.start-1)
+    window[offsetY:offsetY+y1-y0, offsetX:offsetX+x1-x0] = grid[y0-gridY:y1-gridY, 
+                                                                x0-gridX:x1-gridX]
+    return window
+
+def getNotVisibleNeighborMasks(padded: np.ndarray) -> np.ndarray:
+    ''' For each inner cell of a padded boolean window, a 4 bit mask of which
+    neighbors are False (FOW_ABOVE | FOW_RIGHT | FOW_BELOW | FOW_LEFT).'''
+    hidden = ~padded
+    return (hidden[:-2, 1:-1] * FOW_ABOVE + hidden[1:-1, 2:] * FOW_RIGHT
+            + hidden[2:, 1:-1] * FOW_BELOW + hidden[1:-1, :-2] * FOW_LEFT)
+
+def drawFogDarkening(surface: pygame.Surface, alpha: np.ndarray, 
+                     origin: Tuple[int]) -> None:
+    ''' Blit black over the window with a per-cell alpha.  alpha is indexed 
+    [y, x] in cells; it's blown up to pixels and written into a per-pixel 
+    alpha surface in one go, then blitted once.'''
+    global FOW_SURFACE
+    height = alpha.shape[0]*constants.CELL_HEIGHT
+    width = alpha.shape[1]*constants.CELL_WIDTH
+    if (FOW_SURFACE is None or FOW_SURFACE.get_width() < width 
+                            or FOW_SURFACE.get_height() < height):
+        FOW_SURFACE = pygame.Surface((width, height), pygame.SRCALPHA)
+        FOW_SURFACE.fill((*constants.COLOR_BLACK, 0))
+
+    pixelAlpha = alpha.repeat(constants.CELL_HEIGHT, axis=0).repeat(constants.CELL_WIDTH, axis=1)
+    surfaceAlpha = pygame.surfarray.pixels_alpha(FOW_SURFACE)
+    surfaceAlpha[:width, :height] = pixelAlpha.T
+    del surfaceAlpha # unlocks the surface
+
+    surface.blit(FOW_SURFACE, origin, (0, 0, width, height))
+
+def getFowEdgeSprite(neighborMask: int, alpha: int=None) -> pygame.Surface:
+    ''' The (shared, don't modify it) overhanging FOW sprite for a cell whose
+    not visible neighbors are neighborMask, optionally with surface alpha.'''
+    if not FOW_EDGE_SPRITES:
+        buildFowEdgeSprites()
+    return FOW_EDGE_SPRITES[(neighborMask, alpha)]
+
+def buildFowEdgeSprites() -> None:
+    ''' Pre-render every FOW edge sprite, for all 16 neighbor masks, both 
+    opaque and darkened, so drawing edges is just a lookup and a blit.'''
+    for neighborMask in range(16):
+        sprite = renderFowEdgeSprite(neighborMask)
+        FOW_EDGE_SPRITES[(neighborMask, None)] = sprite
+        if sprite is not None:
+            sprite = sprite.copy()
+            sprite.set_alpha(FOW_DARKENED_ALPHA)
+        FOW_EDGE_SPRITES[(neighborMask, FOW_DARKENED_ALPHA)] = sprite
+
+def renderFowEdgeSprite(neighborMask: int) -> pygame.Surface:
     ''' On a visible tile, draw the overhanging FOW effect, if applicable.
+    neighborMask says which neighbors are not visible, as FOW_* bits.
     We could replace this (in fewer LOC) with just doing each side as needed
     and rotating and reblitting. a single image.  Maybe we should, dunno, but I like 
     the flexibility, because later we won't get away with that trick for walls.
     Meh.  Need to find something a bit more elegant, eventually.'''
-    aboveIsNotVis = True if (y==0) else not testFunction(x, y-1)
-    leftIsNotVis = True if (x==0) else not testFunction(x-1, y)
-    belowIsNotVis = True if (y==limits[1]-1) else not testFunction(x, y+1)
-    rightIsNotVis = True if (x==limits[0]-1) else not testFunction(x+1, y)
+    aboveIsNotVis = bool(neighborMask & FOW_ABOVE)
+    leftIsNotVis = bool(neighborMask & FOW_LEFT)
+    belowIsNotVis = bool(neighborMask & FOW_BELOW)
+    rightIsNotVis = bool(neighborMask & FOW_RIGHT)
 
     numNotVisNeighbors = aboveIsNotVis+leftIsNotVis+belowIsNotVis+rightIsNotVis
 
@@ -296,74 +460,352 @@ def getFowEdgeSprite(x: int, y: int, limits: Tuple[int],
         rotAngle = 0
         spriteDict = EFFECTS['fow_fourSide']['spriteDict']
 
-    retSprite = ASSETS[spriteDict][0].copy()  
+    # an opaque, colorkeyed copy: these get a surface alpha, which blends
+    # differently on top of the atlas' per-pixel alpha.
+    retSprite = ASSETS[spriteDict][0].convert()
+    retSprite.set_colorkey(constants.COLOR_BLACK)
     retSprite = pygame.transform.rotate(retSprite, rotAngle)
     return retSprite
 
+@lru_cache(maxsize=64)
 def helperTextDims(text='a',font=constants.FONT_DEBUG) -> Tuple[int]:
+    ''' Memoized; the default is used as the line height all over the place.'''
     fontObject = font.render(text, False, (0,0,0))
     fontRect = fontObject.get_rect()
     return fontRect.width, fontRect.height
 
 def helperTextObjects(text, textColor, bgColor=None):
     ''' Render text, return surface and bounding geometry '''
-    textSurface = constants.FONT_DEBUG.render(text, True, textColor, bgColor)
+    textSurface = renderText(text, constants.FONT_DEBUG, tuple(textColor), 
+                             None if bgColor is None else tuple(bgColor), True)
     return textSurface, textSurface.get_rect()
 
+@lru_cache(maxsize=constants.TEXT_CACHE_SIZE)
+def renderText(text: str, font: pygame.font.Font, textColor: Tuple[int], 
+               bgColor: Tuple[int], antialias: bool) -> pygame.Surface:
+    ''' font.render, memoized.  The same strings (menus, stats, messages) get
+    drawn every frame.  The surfaces are shared, so don't draw on them.'''
+    return font.render(text, antialias, textColor, bgColor)
+
 def drawGameMessages(surface: pygame.Surface, game: 'game.Game') -> None:
+    ''' The last few messages, along the bottom of surface.  They are rendered
+    together onto one surface, which is kept until a message is added.'''
+    global MESSAGE_LOG_SURFACE, MESSAGE_LOG_KEY
+    messageLogKey = (id(game.messageHistory), len(game.messageHistory), surface.get_width())
+    if messageLogKey != MESSAGE_LOG_KEY:
+        MESSAGE_LOG_SURFACE = renderGameMessages(game, surface.get_width())
+        MESSAGE_LOG_KEY = messageLogKey
+
+    if MESSAGE_LOG_SURFACE is None:
+        return
+    startY = surface.get_height() - MESSAGE_LOG_SURFACE.get_height()
+    surface.blit(MESSAGE_LOG_SURFACE, (0, startY))
+
+def renderGameMessages(game: 'game.Game', width: int) -> pygame.Surface:
     numMessages = min(len(game.messageHistory), constants.NUM_GAME_MESSAGES)
     if numMessages==0:
-        return 0
+        return None
     messages = game.messageHistory[-numMessages:]
 
     _, height = helperTextDims()
-    startY = surface.get_height() - numMessages*height
-    drawTextList(surface, messages, startX=0, startY=startY)
-
-def drawDebug(surface: pygame.Surface) -> None:
-    drawFPS(surface)
-
-def drawFPS(surface: pygame.Surface) -> None:
-    drawText(surface, "fps: " + str(int(CLOCK.get_fps())), (0,0), constants.COLOR_WHITE, 
+    messageLog = pygame.Surface((width, numMessages*height), pygame.SRCALPHA)
+    drawTextList(messageLog, messages, startX=0, startY=0)
+    return messageLog
+
+def drawDebug(surface: pygame.Surface, fpsText: str=None) -> None:
+    drawFPS(surface, fpsText)
+    if PROFILER.showOverlay:
+        drawProfilerOverlay(surface)
+
+def drawProfilerOverlay(surface: pygame.Surface) -> None:
+    ''' The frame profiler's percentiles, under the fps.  Names are left 
+    aligned, numbers right aligned in fixed columns.'''
+    overlayRect = getProfilerOverlayRect()
+    surface.fill(constants.COLOR_BLACK, overlayRect)
+    nameWidth, numberWidth = getProfilerOverlayColumns()
+    _, height = helperTextDims()
+    for rowIdx, row in enumerate(PROFILER.overlayRows):
+        y = overlayRect.top + rowIdx*height
+        drawText(surface, row[0], (0, y), constants.COLOR_WHITE)
+        for colIdx, cell in enumerate(row[1:], start=1):
+            x = nameWidth + colIdx*numberWidth - helperTextDims(cell)[0]
+            drawText(surface, cell, (x, y), constants.COLOR_WHITE)
+
+def getProfilerOverlayColumns() -> Tuple[int]:
+    ''' Pixel widths of the name column and of each number column. '''
+    names = [row[0] for row in PROFILER.overlayRows]
+    nameWidth = max((helperTextDims(name)[0] for name in names), default=0)
+    return nameWidth, helperTextDims("  0000.00")[0]
+
+def getProfilerOverlayRect() -> pygame.Rect:
+    _, height = helperTextDims()
+    nameWidth, numberWidth = getProfilerOverlayColumns()
+    numColumns = max((len(row)-1 for row in PROFILER.overlayRows), default=0)
+    return pygame.Rect(0, height, nameWidth + numColumns*numberWidth, 
+                       height*len(PROFILER.overlayRows))
+
+def getFpsText() -> str:
+    fpsText = "fps: " + str(int(CLOCK.get_fps()))
+    if constants.SHOW_ASSET_CACHE_STATS:
+        fpsText += "  " + ASSETS.cache.getStatsText()
+    return fpsText
+
+def drawFPS(surface: pygame.Surface, fpsText: str=None) -> None:
+    if fpsText is None:
+        fpsText = getFpsText()
+    drawText(surface, fpsText, (0,0), constants.COLOR_WHITE, 
              bgColor=constants.COLOR_BLACK)
 
-def drawObjects(surface: pygame.Surface, objects: Dict[str, List[Actor]], **kwargs) -> None:
-    ''' objects[depth] = [Actor1, Actor2, ...]'''
+def drawObjects(surface: pygame.Surface, objects: Dict[str, List[Actor]], 
+                objectBlits: Dict[Actor, list]=None, **kwargs) -> None:
+    ''' objects[depth] = [Actor1, Actor2, ...]
+    objectBlits, if given, are the already collected getObjectBlits(objects).
+    Each depth layer goes to the surface in a single Surface.blits call.'''
+    if objectBlits is None:
+        layers = (getLayerBlits(objects, depth, **kwargs) for depth in constants.DEPTHS)
+    else:
+        layers = groupBlitsByLayer(objectBlits).values()
+    for layerBlits in layers:
+        if layerBlits:
+            surface.blits(layerBlits, doreturn=False)
+
+def getLayerBlits(objects: Dict[str, List[Actor]], depth: str, 
+                  **kwargs) -> List[Tuple[pygame.Surface, Tuple[int]]]:
+    ''' The culled (sprite, position) pairs of one depth layer, in order. '''
+    layerBlits = []
+    for gameObj in getDrawableObjects(objects, depth):
+        gameObj.addBlits(layerBlits, **kwargs)
+    return layerBlits
+
+def groupBlitsByLayer(objectBlits: Dict[Actor, list]) -> Dict[str, list]:
+    ''' objectBlits regrouped as layerBlits[depth] = [(sprite, position), ...],
+    keeping the drawing order within each layer.'''
+    layerBlits = {depth: [] for depth in constants.DEPTHS}
+    for gameObj, blits in objectBlits.items():
+        layerBlits[gameObj.depth].extend(blits)
+    return layerBlits
+
+def getObjectBlits(objects: Dict[str, List[Actor]], **kwargs) -> Dict[Actor, list]:
+    ''' Actor.getBlits() for every drawable object, in drawing order.'''
+    objectBlits = {}
     for depth in constants.DEPTHS:
-        for gameObj in objects[depth]:
-            if gameObj is None:
-                continue
-            if gameObj.depth != depth:
-                continue
-            if getattr(gameObj, "deleted", False):
-                continue
-
-            gameObj.draw(surface, **kwargs), 
+        for gameObj in getDrawableObjects(objects, depth):
+            objectBlits[gameObj] = gameObj.getBlits(**kwargs)
+    return objectBlits
+
+def getCulledObjects(level: 'levels.Level', viewer: 'creatures.Viewer'=None,
+                     camera: Camera=None, drawHistory: bool=False) -> Dict[str, List[Actor]]:
+    ''' level.objects, cut down to the actors on cells in (or just around, see
+    CULL_BORDER) the camera window which the viewer can see--or, given
+    drawHistory, has seen.  They are found through the level's spatial index,
+    so actors off screen or out of sight never cost a per-actor call.  Each
+    depth keeps its drawing order; Actor.addBlits still has the final say.'''
+    if camera is None:
+        return level.objects
+    xRange, yRange = camera.getVisibleCellRanges(level.mapWidth, level.mapHeight)
+    x0, x1 = xRange.start - CULL_BORDER, xRange.stop + CULL_BORDER
+    y0, y1 = yRange.start - CULL_BORDER, yRange.stop + CULL_BORDER
+    if viewer is None:
+        grid, gridX, gridY = None, 0, 0
+    elif drawHistory:
+        grid, gridX, gridY = viewer.exploredMap, 0, 0
+    else:
+        (gridX, gridY), grid = viewer.fovWindow
+    if grid is not None: # nothing off the grid can be seen
+        x0, x1 = max(x0, gridX), min(x1, gridX + grid.shape[1])
+        y0, y1 = max(y0, gridY), min(y1, gridY + grid.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return {depth: [] for depth in level.objects}
+
+    objectsByCoords = level.objectsByCoords
+    culled = set()
+    if len(objectsByCoords) < (x1-x0)*(y1-y0):
+        # fewer occupied cells than cells to look at: visit those instead.
+        for (x, y), cellObjects in objectsByCoords.items():
+            if (x0 <= x < x1 and y0 <= y < y1
+                    and (grid is None or grid[y-gridY, x-gridX])):
+                culled.update(cellObjects)
+    else:
+        if grid is None:
+            cells = np.ones((y1-y0, x1-x0), dtype=bool)
+        else:
+            cells = grid[y0-gridY:y1-gridY, x0-gridX:x1-gridX]
+        ys, xs = np.nonzero(cells)
+        for coords in zip((xs + x0).tolist(), (ys + y0).tolist()):
+            cellObjects = objectsByCoords.get(coords)
+            if cellObjects:
+                culled.update(cellObjects)
+    return {depth: [gameObj for gameObj in objects if gameObj in culled]
+            for depth, objects in level.objects.items()}
+
+def getDrawableObjects(objects: Dict[str, List[Actor]], depth: str) -> List[Actor]:
+    ''' The objects filed under depth which should actually be drawn there. '''
+    return [gameObj for gameObj in objects[depth] 
+            if gameObj is not None 
+               and gameObj.depth == depth 
+               and not getattr(gameObj, "deleted", False)]
 
 def drawGame(mainSurface, mapSurface, chyronSurface, game: 'game.Game') -> None:
+    composeGame(mainSurface, mapSurface, chyronSurface, game)
+    with PROFILER.section('flip'):
+        pygame.display.flip()
 
+def composeGame(mainSurface, mapSurface, chyronSurface, game: 'game.Game',
+                objectBlits: Dict[Actor, list]=None, fpsText: str=None) -> None:
+    ''' Draw the whole game onto mainSurface, without pushing it to the display.'''
     vcKwargs = {'viewer': game.viewer, 'camera': game.camera, }
     level = game.currentLevel
 
     mainSurface.fill(constants.COLOR_BLACK)
     
     # the map and such.
-    mapSurface.fill(constants.COLOR_BLACK)
-    drawObjects(mapSurface, level.tilesFlattened, drawHistory=True, **vcKwargs)
-    drawObjects(mapSurface, level.objects, **vcKwargs)
-    drawFogOfWar(mapSurface, level, **vcKwargs)
-    drawGameMessages(mapSurface, game)
+    with PROFILER.section('background'):
+        mapSurface.fill(constants.COLOR_BLACK)
+        drawBackground(mapSurface, level, game.camera)
+    with PROFILER.section('objects'):
+        if objectBlits is None:
+            drawObjects(mapSurface, getCulledObjects(level, **vcKwargs), **vcKwargs)
+        else:
+            drawObjects(mapSurface, level.objects, objectBlits=objectBlits)
+    with PROFILER.section('fog'):
+        drawFogOfWar(mapSurface, level, **vcKwargs)
+    with PROFILER.section('messages'):
+        drawGameMessages(mapSurface, game)
     mainSurface.blit(mapSurface, (0,0))
 
     # off-map portions of the interface 
-    drawChyron(chyronSurface, game)
-    mainSurface.blit(chyronSurface, (0,mapSurface.get_height()))
+    with PROFILER.section('chyron'):
+        drawChyron(chyronSurface, game)
+        mainSurface.blit(chyronSurface, (0,mapSurface.get_height()))
 
-    drawDebug(mainSurface)
-    pygame.display.flip()
+    with PROFILER.section('debug'):
+        drawDebug(mainSurface, fpsText)
+
+
+class DirtyRectRenderer:
+    ''' An optional stand-in for drawGame, for when CPU is scarce.  It works 
+    out which parts of the screen changed since the last frame (actors moving
+    or animating, new messages, the chyron, the fps and profiler readouts) and
+    only redraws, and only pushes to the display, those.  When nothing 
+    changed, nothing is drawn at all.  Camera, FOV or level changes redraw 
+    the whole screen.
+
+    Menus draw straight onto the screen; they call invalidateScreen() on the 
+    way out so the next frame is drawn in full.'''
+    FPS_REFRESH_MS = 1000
+
+    def __init__(self):
+        self.lastScreenState = None
+        self.lastFovWindow = None
+        self.lastObjectBlits = {}
+        self.lastMessageCount = None
+        self.lastChyronState = None
+        self.fpsText = getFpsText()
+        self.fpsTextRect = pygame.Rect(0, 0, 0, 0)
+        self.lastFpsRefresh = 0
+        self.lastOverlayVersion = None
+        self.overlayRect = pygame.Rect(0, 0, 0, 0)
+
+    def draw(self, mainSurface, mapSurface, chyronSurface, game: 'game.Game') -> None:
+        mapHeight = mapSurface.get_height()
+        vcKwargs = {'viewer': game.viewer, 'camera': game.camera, }
+        with PROFILER.section('objects'):
+            objectBlits = getObjectBlits(getCulledObjects(game.currentLevel, **vcKwargs),
+                                         **vcKwargs)
+
+        dirtyRects = self.findDirtyRects(mainSurface, mapSurface, game, objectBlits)
+        if not dirtyRects:
+            return
+
+        clipRect = dirtyRects[0].unionall(dirtyRects[1:])
+        mainSurface.set_clip(clipRect)
+        mapSurface.set_clip(clipRect)
+        chyronSurface.set_clip(clipRect.move(0, -mapHeight))
+
+        composeGame(mainSurface, mapSurface, chyronSurface, game, 
+                    objectBlits=objectBlits, fpsText=self.fpsText)
+
+        for surface in (mainSurface, mapSurface, chyronSurface):
+            surface.set_clip(None)
+        with PROFILER.section('flip'):
+            pygame.display.update(dirtyRects)
+
+    def findDirtyRects(self, mainSurface, mapSurface, game: 'game.Game',
+                       objectBlits: Dict[Actor, list]) -> List[pygame.Rect]:
+        ''' Compare this frame to the last, and remember this one.'''
+        dirtyRects = []
+        mapRect = mapSurface.get_rect()
+        level = game.currentLevel
+        
+        screenState = (SCREEN_GENERATION, level.uniqueID, level.tilesVersion,
+                       game.camera.x, game.camera.y)
+        fovWindow = game.viewer.fovWindow
+        if screenState != self.lastScreenState or fovWindow is not self.lastFovWindow:
+            dirtyRects.append(mainSurface.get_rect())
+        self.lastScreenState = screenState
+        self.lastFovWindow = fovWindow
+
+        # actors which moved, animated, (dis)appeared or changed emote
+        for gameObj in objectBlits.keys() | self.lastObjectBlits.keys():
+            blits = objectBlits.get(gameObj, [])
+            lastBlits = self.lastObjectBlits.get(gameObj, [])
+            if blits == lastBlits:
+                continue
+            for sprite, position in blits + lastBlits:
+                dirtyRects.append(sprite.get_rect(topleft=position).clip(mapRect))
+        self.lastObjectBlits = objectBlits
+
+        messageCount = len(game.messageHistory)
+        if messageCount != self.lastMessageCount:
+            _, height = helperTextDims()
+            messagesHeight = constants.NUM_GAME_MESSAGES * height
+            dirtyRects.append(pygame.Rect(0, mapRect.height - messagesHeight, 
+                                          mapRect.width, messagesHeight))
+        self.lastMessageCount = messageCount
+
+        chyronState = (id(game.player), game.player.statsVersion)
+        if chyronState != self.lastChyronState:
+            dirtyRects.append(pygame.Rect(0, mapRect.height, mainSurface.get_width(),
+                                          mainSurface.get_height() - mapRect.height))
+        self.lastChyronState = chyronState
+
+        now = pygame.time.get_ticks()
+        if now - self.lastFpsRefresh > self.FPS_REFRESH_MS:
+            self.lastFpsRefresh = now
+            fpsText = getFpsText()
+            if fpsText != self.fpsText:
+                self.fpsText = fpsText
+                textRect = pygame.Rect((0, 0), helperTextDims(fpsText))
+                dirtyRects.append(textRect.union(self.fpsTextRect))
+                self.fpsTextRect = textRect
+
+        if PROFILER.overlayVersion != self.lastOverlayVersion:
+            self.lastOverlayVersion = PROFILER.overlayVersion
+            overlayRect = getProfilerOverlayRect()
+            dirtyRects.append(overlayRect.union(self.overlayRect))
+            self.overlayRect = overlayRect
+
+        return [rect for rect in dirtyRects if rect.width and rect.height]
+
+
+def invalidateScreen() -> None:
+    ''' Whatever is on the screen can't be trusted (e.g. a menu was drawn over
+    it), so the DirtyRectRenderer should redraw everything next frame.'''
+    global SCREEN_GENERATION
+    SCREEN_GENERATION += 1
 
 def drawChyron(surface: pygame.Surface, game: 'game.Game') -> None:
-    ''' the bit of the UI drawn below the map'''
+    ''' the bit of the UI drawn below the map.  It only shows the player's
+    stats, so it is rendered once and reused until player.statsVersion moves.'''
+    global CHYRON_SURFACE, CHYRON_KEY
+    chyronKey = (id(game.player), game.player.statsVersion, surface.get_size())
+    if chyronKey != CHYRON_KEY:
+        CHYRON_SURFACE = pygame.Surface(surface.get_size()).convert()
+        renderChyron(CHYRON_SURFACE, game)
+        CHYRON_KEY = chyronKey
+    surface.blit(CHYRON_SURFACE, (0, 0))
+
+def renderChyron(surface: pygame.Surface, game: 'game.Game') -> None:
     surface.fill(constants.COLOR_GREY)
 
     # health
@@ -411,15 +853,296 @@ def drawTextList(surface: pygame.Surface, messages: tuple,
     for idx, (message, textColor, bgColor) in enumerate(messages):
         drawText(surface,message, (startX, startY+idx*height),textColor,bgColor)  
 
+class SpriteAtlas:
+    ''' Every library sprite frame, packed into one per-pixel alpha surface.
+    Frames are handed out as subsurfaces of the atlas, so the sheets they
+    came from can be dropped once the atlas is built.
+
+    frameRects maps (path, colIdx, rowIdx) to where that frame sits.
+    sources maps each sheet path to its (mtime, size) when it was packed.
+    '''
+    def __init__(self, surface: pygame.Surface, frameRects: Dict[tuple, pygame.Rect],
+                       sources: Dict[str, tuple]) -> None:
+        self.surface = surface
+        self.frameRects = frameRects
+        self.sources = sources
+        self.frames = {frameKey: surface.subsurface(rect)
+                       for frameKey, rect in frameRects.items()}
+
+    def __contains__(self, spriteDict: namedtuple) -> bool:
+        return all(frameKey in self.frames for frameKey in getFrameKeys(spriteDict))
+
+    def getAnimation(self, spriteDict: namedtuple) -> List[pygame.Surface]:
+        return [self.frames[frameKey] for frameKey in getFrameKeys(spriteDict)]
+
+
+def getFrameKeys(spriteDict: namedtuple) -> List[tuple]:
+    return [(spriteDict.path, spriteDict.colIdx+idx, spriteDict.rowIdx)
+            for idx in range(spriteDict.numSprites)]
+
+def getSheetSource(fileName: str) -> tuple:
+    ''' (mtime, size) of a sheet, to tell whether a cached atlas is stale. '''
+    try:
+        fileStat = os.stat(fileName)
+    except OSError:
+        return None
+    return (fileStat.st_mtime_ns, fileStat.st_size)
+
+def packSpriteAtlas(spriteDicts: List[namedtuple], root: str,
+                    imageUnitX: int=constants.CELL_WIDTH,
+                    imageUnitY: int=constants.CELL_HEIGHT) -> SpriteAtlas:
+    ''' Slice every frame out of its sheet onto a roughly square grid. '''
+    # one entry per distinct frame, in a stable order
+    frameKeys = []
+    for spriteDict in spriteDicts:
+        for frameKey in getFrameKeys(spriteDict):
+            if frameKey not in frameKeys:
+                frameKeys.append(frameKey)
+
+    numCols = max(1, math.ceil(math.sqrt(len(frameKeys))))
+    numRows = max(1, math.ceil(len(frameKeys) / numCols))
+    atlas = pygame.Surface((numCols*imageUnitX, numRows*imageUnitY))
+    atlas.fill(constants.COLOR_BLACK)
+
+    frameRects = {}
+    sheets = {}
+    for frameIdx, (path, colIdx, rowIdx) in enumerate(frameKeys):
+        if path not in sheets:
+            try:
+                sheets[path] = pygame.image.load(root+path).convert()
+            except (pygame.error, FileNotFoundError):
+                sheets[path] = None # left out; ASSETS falls back to the sheet
+        if sheets[path] is None:
+            continue
+        rect = pygame.Rect((frameIdx % numCols) * imageUnitX,
+                           (frameIdx // numCols) * imageUnitY,
+                           imageUnitX, imageUnitY)
+        atlas.blit(sheets[path], rect.topleft,
+                   (colIdx*imageUnitX, rowIdx*imageUnitY, imageUnitX, imageUnitY))
+        frameRects[(path, colIdx, rowIdx)] = rect
+
+    sources = {path: getSheetSource(root+path) for path, sheet in sheets.items()
+               if sheet is not None}
+
+    # black was the colorkey on every sliced sprite; bake it into alpha
+    atlas.set_colorkey(constants.COLOR_BLACK)
+    return SpriteAtlas(atlas.convert_alpha(), frameRects, sources)
+
+
+''' The atlas cache file: SPRITE_CACHE_MAGIC, a 4 byte header length, a json 
+header (size, frames, sources), then the atlas as raw RGBA rows.'''
+SPRITE_CACHE_MAGIC = b'qQuestSprites\x01'
+
+def saveAtlasCache(atlas: SpriteAtlas, fileName: str) -> None:
+    ''' Written to a temporary file alongside, then moved into place, so that
+    a game stopped part way through never leaves a half written cache.'''
+    header = {'size' : atlas.surface.get_size(),
+              'frames' : [[*frameKey, *rect] for frameKey, rect in atlas.frameRects.items()],
+              'sources' : atlas.sources}
+    headerBytes = json.dumps(header).encode('utf-8')
+    fd, tempName = tempfile.mkstemp(dir=os.path.dirname(fileName) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SPRITE_CACHE_MAGIC)
+            f.write(struct.pack('<I', len(headerBytes)))
+            f.write(headerBytes)
+            f.write(pygame.image.tostring(atlas.surface, 'RGBA'))
+        os.replace(tempName, fileName)
+    except BaseException:
+        os.remove(tempName)
+        raise
+
+def loadAtlasCache(fileName: str, spriteDicts: List[namedtuple], 
+                   root: str) -> SpriteAtlas:
+    ''' The cached atlas.  None if there is no cache, or it is missing a 
+    frame, or any sheet has changed since it was written, or it is truncated
+    or otherwise unreadable.'''
+    try:
+        with open(fileName, 'rb') as f:
+            buffer = f.read()
+    except OSError:
+        return None
+    try:
+        return readAtlasCache(buffer, spriteDicts, root)
+    except (ValueError, json.JSONDecodeError, struct.error, KeyError, TypeError):
+        # ValueError covers a short file (frombuffer) and bad utf-8; KeyError
+        # and TypeError a header of the wrong shape.
+        return None
+
+def readAtlasCache(buffer: bytes, spriteDicts: List[namedtuple], 
+                   root: str) -> SpriteAtlas:
+    offset = len(SPRITE_CACHE_MAGIC)
+    if buffer[:offset] != SPRITE_CACHE_MAGIC:
+        return None
+    headerLength, = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    header = json.loads(buffer[offset:offset+headerLength].decode('utf-8'))
+    offset += headerLength
+
+    frameRects = {(path, colIdx, rowIdx): pygame.Rect(x, y, w, h)
+                  for path, colIdx, rowIdx, x, y, w, h in header['frames']}
+    sources = {path: tuple(source) for path, source in header['sources'].items()}
+    for spriteDict in spriteDicts:
+        if any(frameKey not in frameRects for frameKey in getFrameKeys(spriteDict)):
+            return None
+    for path, source in sources.items():
+        if getSheetSource(root+path) != source:
+            return None
+
+    size = tuple(header['size'])
+    # a view, not a slice: convert_alpha makes the one copy of the pixels.
+    pixels = memoryview(buffer)[offset:offset + size[0]*size[1]*4]
+    surface = pygame.image.frombuffer(pixels, size, 'RGBA').convert_alpha()
+    return SpriteAtlas(surface, frameRects, sources)
+
+
+def getLibrarySpriteDicts() -> List[namedtuple]:
+    ''' Every SpriteDict referenced by the tile, item, character, portal, and
+    effect libraries, in library order. '''
+    return [spriteDict for dictTuple in getLibrarySpriteDictTuples()
+                       for spriteDict in dictTuple]
+
+def getLibrarySpriteDictTuples() -> List[Tuple[namedtuple]]:
+    ''' The animations (tuples of SpriteDicts) the libraries hand to ASSETS. '''
+    # imported here: the libraries pull in modules that import graphics.
+    from qQuest.lib.characterLib import CHARACTERS, PLAYER
+    from qQuest.lib.itemLib import ITEMS
+    from qQuest.lib.portalLib import PORTALS
+    from qQuest.lib.tileLib import TILES
+
+    entries = itertools.chain(TILES.values(), ITEMS.values(), CHARACTERS.values(),
+                              (PLAYER,), PORTALS.values(), EFFECTS.values())
+    dictTuples = []
+    for entry in entries:
+        for value in entry.values():
+            if (isinstance(value, tuple) and value
+                and all(isinstance(spriteDict, constants.SpriteDict) for spriteDict in value)):
+                dictTuples.append(value)
+    return dictTuples
+
+
+class AssetCache:
+    ''' Least-recently-used cache of sheets and animations, bounded by an
+    estimate of the pixel memory they hold rather than by an entry count.
+    Surfaces that are subsurfaces (e.g. of the atlas) cost nothing here; 
+    their parent owns the pixels.  Cut animations don't need their sheet, 
+    so an unused sheet simply ages out.  Levels loading in the background
+    compile their backgrounds from it too, hence the lock.
+    '''
+    def __init__(self, budgetBytes: int) -> None:
+        self.lock = threading.RLock()
+        self.budgetBytes = budgetBytes
+        self.entries = collections.OrderedDict() # key -> (asset, numBytes)
+        self.numBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, loader: Callable):
+        ''' The asset at key, or loader() stored there. '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            asset = loader()
+            numBytes = getAssetBytes(asset)
+            self.entries[key] = (asset, numBytes)
+            self.numBytes += numBytes
+            self.evict()
+            return asset
+
+    def evict(self) -> None:
+        ''' Drop the least recently used entries until under budget.  The 
+        newest entry always stays, even if it alone is over budget.'''
+        while self.numBytes > self.budgetBytes and len(self.entries) > 1:
+            _, (_, numBytes) = self.entries.popitem(last=False)
+            self.numBytes -= numBytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.numBytes = 0
+
+    def getStatsText(self) -> str:
+        return "assets: {}KB/{}KB hit {} miss {} evict {}".format(
+                    self.numBytes // 1024, self.budgetBytes // 1024,
+                    self.hits, self.misses, self.evictions)
+
+
+def getAssetBytes(asset) -> int:
+    ''' Approximate pixel memory owned by a surface, sheet, or animation. '''
+    if isinstance(asset, SpriteSheet):
+        asset = asset.spriteSheet
+    if isinstance(asset, (list, tuple)):
+        return sum(getAssetBytes(item) for item in asset)
+    if isinstance(asset, pygame.Surface):
+        if asset.get_parent() is not None:
+            return 0
+        return asset.get_pitch() * asset.get_height()
+    return 0
+
+
 class structAssets():
     ''' Container class for sprites, animations, and compiled level backgrounds.
-    It starts empty and gets filled via requests & memoization.
+    Library sprites come from a single atlas, built on first use (or via
+    buildAtlas); anything else is sliced from its sheet on request.
     '''
     def __init__(self):
-        self.compiledLevelMaps = {}
+        self.compiledLevelMaps = weakref.WeakKeyDictionary() # level -> {pieceKey: ...}
         self.root = "pythonApplication1/" #fix this!
+        self.atlas = None
+        self.cache = AssetCache(constants.ASSET_CACHE_BUDGET)
+
+    def buildAtlas(self) -> SpriteAtlas:
+        ''' Pack the library sprites.  Needs a display mode to be set.  With
+        constants.SPRITE_CACHE_FILE set, the atlas is read from there, and
+        written there whenever it had to be rebuilt.'''
+        spriteDicts = getLibrarySpriteDicts()
+        cacheFile = constants.SPRITE_CACHE_FILE
+        if cacheFile is not None:
+            self.atlas = loadAtlasCache(self.root+cacheFile, spriteDicts, self.root)
+            if self.atlas is not None:
+                return self.atlas
+
+        self.atlas = packSpriteAtlas(spriteDicts, self.root)
+        if cacheFile is not None:
+            saveAtlasCache(self.atlas, self.root+cacheFile)
+        return self.atlas
+
+    def warmUp(self) -> float:
+        ''' Do everything that would otherwise happen the first time something
+        is drawn: build the atlas, cut every library animation, render the FOW 
+        edges.  Returns how long that took, in seconds.'''
+        startTime = time.perf_counter()
+        self.buildAtlas()
+        for dictTuple in getLibrarySpriteDictTuples():
+            self[dictTuple]
+        buildFowEdgeSprites()
+        return time.perf_counter() - startTime
+
+    def getCompiledLevelMap(self, level: 'levels.Level', pieceKey, 
+                            tileGrid: 'tilegrid.TileGrid', tilesVersion: int) -> pygame.Surface:
+        ''' The pre-rendered background for a piece of a level (see 
+        Level.getTileGridPieces).  It is recompiled only when the level reports
+        that the piece's tiles have changed.  Kept by the Level itself, not its
+        uniqueID, which a level loaded from a save may share with one of ours.'''
+        pieces = self.compiledLevelMaps.setdefault(level, {})
+        compiledVersion, background = pieces.get(pieceKey, (None, None))
+        if compiledVersion != tilesVersion:
+            background = compileBackgroundTiles(tileGrid)
+            pieces[pieceKey] = (tilesVersion, background)
+        return background
+
+    def forgetCompiledLevelMap(self, level: 'levels.Level', pieceKey=None) -> None:
+        ''' Drop a piece's pre-rendered background, for when the level lets go
+        of the tiles it was drawn from.'''
+        self.compiledLevelMaps.get(level, {}).pop(pieceKey, None)
 
-    @lru_cache(maxsize=256)
     def __getitem__(self, dictTuple: Tuple[namedtuple]) -> List[pygame.Surface]:
         '''
         Key should be a tuple of namedtuples with {'path', 'colIdx', 'rowIdx', 'numSprites=1'}.
@@ -427,27 +1150,32 @@ class structAssets():
 
         the 'dictTuple' entries/spriteDicts are actually namedtuples, which are hashable.
 
-        Memoized
+        Cached in self.cache
         '''
+        return self.cache.get(dictTuple, lambda: self.getAnimation(dictTuple))
+
+    def getAnimation(self, dictTuple: Tuple[namedtuple]) -> List[pygame.Surface]:
         if type(dictTuple) == namedtuple:
             dictTuple = (dictTuple,)
         
+        if self.atlas is None:
+            self.buildAtlas()
+
         animationOut = []
         for spriteDict in dictTuple:
-            #spriteDict = spriteDict._asdict() #From namedtuple to dict.
-            sheet = loadSpriteSheet(self.root+spriteDict.path)
+            if spriteDict in self.atlas:
+                animationOut.extend(self.atlas.getAnimation(spriteDict))
+                continue
+            sheet = self.getSpriteSheet(self.root+spriteDict.path)
             spriteSurface = sheet.getAnimation(colIdx=spriteDict.colIdx,
                                                rowIdx=spriteDict.rowIdx,
                                                numSprites=spriteDict.numSprites)
             animationOut.extend(spriteSurface)
         return animationOut
 
-
-@lru_cache(maxsize=256)
-def loadSpriteSheet(path: str) -> SpriteSheet:
-    ''' load a sprite sheet, but memoized. 
-    Probably unnecessary for the amount of data we're dealing with.'''
-    return SpriteSheet(path)
+    def getSpriteSheet(self, path: str) -> SpriteSheet:
+        ''' load a sprite sheet, cached alongside the animations. '''
+        return self.cache.get(('sheet', path), lambda: SpriteSheet(path))
 
 
 def spriteDebugger(surface) -> None:
@@ -47,19 +47,21 @@ class Item(Actor):
             else:
                 GAME.addMessage(actor.name + " picked up " + self.name)
                 actor.container.inventory.append(self)
+                actor.container.contentsChanged()
                 GAME.currentLevel.removeObject(self)
                 # GAME.currentLevel.objects.remove(self)
                 self.currentContainer = actor.container
 
     def drop(self):
         actor = self.currentContainer.owner
-        GAME.currentLevel.addObject(self) #clunky AF
-        # GAME.currentLevel.objects.append(self) #clunky AF
         self.currentContainer.inventory.remove(self)
+        self.currentContainer.contentsChanged()
         #self.currentContainer = None
         self.x = actor.x  
         self.y = actor.y 
         self.resyncGraphicPosition()
+        GAME.currentLevel.addObject(self) #clunky AF
+        # GAME.currentLevel.objects.append(self) #clunky AF
         GAME.addMessage("item " + self.name + " dropped!")
 
     def use(self, target):
@@ -74,6 +76,7 @@ class Item(Actor):
         if self.numCharges <= 0:
             if self.depleteFunction is None:
                 self.currentContainer.inventory.remove(self)
+                self.currentContainer.contentsChanged()
                 self.deleted = True
 
             #self.depleteFunction(self)
@@ -106,6 +109,7 @@ class Equipment(Item):
     def unequip(self) -> None:
         #slot stuff
         self.equipped = False
+        self.currentContainer.contentsChanged()
         GAME.addMessage(f'{self.name} unequipped')
         
     def equip(self) -> None:
@@ -113,6 +117,7 @@ class Equipment(Item):
         #self.owner.unequipElseInSlot(self)
         #slot stuff
         self.equipped = True
+        self.currentContainer.contentsChanged()
         GAME.addMessage(f'{self.name} equipped')
         
     @property
@@ -154,6 +159,13 @@ class Container:
     ## TODO: get names of things in inventory
     ## TODO: get weight?
 
+    def contentsChanged(self) -> None:
+        ''' Call after changing the inventory or what's equipped, since the 
+        owner's stats may have changed with it.'''
+        owner = getattr(self, 'owner', None)
+        if hasattr(owner, 'statsChanged'):
+            owner.statsChanged()
+
     def statBonus(self, bonusName:str) -> float:
         bonus = 0
         for item in self:
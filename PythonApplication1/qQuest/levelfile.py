@@ -0,0 +1,192 @@
+''' Levels in a compact, versioned binary format (.lvlb), converted from the
+JSON .lvl files that the level editor and map generator write.
+
+A .lvl cell is a string of decoder ring symbols, which turn into tiles
+(stacked in layers) or items, characters, and portals (entities).  A .lvlb
+file holds the same thing, little-endian:
+
+    header      LEVEL_HEADER: magic, version, the crc32, mtime (in ns) and
+                size of the .lvl it was made from, width, height, number of
+                tile layers, bytes per grid cell, number of keys, number of
+                entities
+    keys        the decoder ring as a table of library keys, each a length
+                byte then utf-8.  Grids and entities refer to keys by their
+                index in the table; 0 means nothing.
+    layers      uint8 (or uint16, if there are over 255 keys) key indices,
+                numLayers x height x width
+    entities    ENTITY_DTYPE records, in the order they are added to a level
+
+Both arrays start on 8 byte boundaries, and are read straight out of the
+memory-mapped file with numpy.frombuffer.
+'''
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from qQuest.lib.tileLib import TILES
+
+LEVEL_FILE_MAGIC = b'qQLv'
+LEVEL_FILE_VERSION = 2
+LEVEL_HEADER = struct.Struct('<4sHIqQHHBBHI')
+ENTITY_DTYPE = np.dtype([('x', '<u2'), ('y', '<u2'), ('key', '<u2')])
+
+
+class LevelLayout:
+    ''' What a level file places where.
+
+    keys are library keys, keys[0] being '' for nothing.  layers is a
+    (numLayers, height, width) array of key indices, a cell's tiles being read
+    from the bottom layer up.  entities is an ENTITY_DTYPE array.'''
+    def __init__(self, keys: List[str], layers: np.ndarray, entities: np.ndarray) -> None:
+        self.keys = keys
+        self.layers = layers
+        self.entities = entities
+
+    @property
+    def width(self) -> int:
+        return self.layers.shape[2]
+
+    @property
+    def height(self) -> int:
+        return self.layers.shape[1]
+
+
+def layoutFromLevelDict(levelDict: dict) -> LevelLayout:
+    ''' The LevelLayout of a level dictionary, as loaded from a .lvl file. '''
+    levelArray = levelDict["level"]
+    decoder = levelDict["decoderRing"]
+    height, width = len(levelArray), len(levelArray[0])
+
+    keys = [''] + list(dict.fromkeys(decoder.values()))
+    keyIndices = {key: idx for idx, key in enumerate(keys)}
+
+    layers = []
+    entities = []
+    for i, row in enumerate(levelArray):
+        for j, allTiles in enumerate(row):
+            layerIdx = 0
+            for tileChar in allTiles:
+                tileTypeKey = decoder[tileChar]
+                if tileTypeKey in TILES:
+                    if layerIdx == len(layers):
+                        layers.append([[0]*width for _ in range(height)])
+                    layers[layerIdx][i][j] = keyIndices[tileTypeKey]
+                    layerIdx += 1
+                else:
+                    entities.append((j, i, keyIndices[tileTypeKey]))
+
+    gridDtype = '<u1' if len(keys) <= 256 else '<u2'
+    layerArray = np.array(layers, dtype=gridDtype).reshape(len(layers), height, width)
+    return LevelLayout(keys, layerArray, np.array(entities, dtype=ENTITY_DTYPE))
+
+def getSourceCrc(sourceName: str) -> int:
+    ''' crc32 of a .lvl file, or None if there isn't one. '''
+    try:
+        with open(sourceName, 'rb') as f:
+            return zlib.crc32(f.read())
+    except OSError:
+        return None
+
+def getSourceStat(sourceName: str) -> Tuple[int]:
+    ''' (mtime, size) of a .lvl file, or None if there isn't one. '''
+    try:
+        fileStat = os.stat(sourceName)
+    except OSError:
+        return None
+    return (fileStat.st_mtime_ns, fileStat.st_size)
+
+def sourceHasChanged(sourceName: str, sourceCrc: int, sourceStat: Tuple[int]) -> bool:
+    ''' Has the .lvl changed since a .lvlb was converted from it?  Only if its
+    mtime has moved but its size hasn't (think a fresh checkout) is the file
+    read, to compare crc32s.'''
+    stat = getSourceStat(sourceName)
+    if stat is None or stat == sourceStat:
+        return False
+    if stat[1] != sourceStat[1]:
+        return True
+    return getSourceCrc(sourceName) != sourceCrc
+
+def getPadding(offset: int) -> int:
+    return -offset % 8
+
+def saveLevelLayout(layout: LevelLayout, fileName: str, sourceName: str=None) -> None:
+    ''' Given sourceName, the .lvl the layout came from, the file records 
+    enough of it for loadLevelLayout to tell when it has changed.  Written to
+    a temporary file alongside, then moved into place, so that a conversion
+    stopped part way through never leaves a half written file.'''
+    sourceCrc, sourceStat = 0, (0, 0)
+    if sourceName is not None:
+        sourceCrc, sourceStat = getSourceCrc(sourceName), getSourceStat(sourceName)
+    keyTable = b''.join(struct.pack('<B', len(key.encode('utf-8'))) + key.encode('utf-8')
+                        for key in layout.keys[1:])
+    header = LEVEL_HEADER.pack(LEVEL_FILE_MAGIC, LEVEL_FILE_VERSION, sourceCrc, *sourceStat,
+                               layout.width, layout.height, len(layout.layers),
+                               layout.layers.dtype.itemsize, len(layout.keys)-1,
+                               len(layout.entities))
+    gridBytes = np.ascontiguousarray(layout.layers).tobytes()
+
+    fd, tempName = tempfile.mkstemp(dir=os.path.dirname(fileName) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            offset = f.write(header + keyTable)
+            offset += f.write(b'\0' * getPadding(offset))
+            offset += f.write(gridBytes)
+            f.write(b'\0' * getPadding(offset))
+            f.write(layout.entities.astype(ENTITY_DTYPE).tobytes())
+        os.replace(tempName, fileName)
+    except BaseException:
+        os.remove(tempName)
+        raise
+
+def loadLevelLayout(fileName: str, sourceName: str=None) -> LevelLayout:
+    ''' The LevelLayout in a .lvlb file, memory-mapped.  None if there is no
+    such file, it is from another version, or sourceName is given and has
+    changed since the file was converted from it, or it is truncated or 
+    otherwise unreadable.'''
+    try:
+        with open(fileName, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        return readLevelLayout(buffer, sourceName)
+    except (ValueError, struct.error, UnicodeDecodeError, IndexError):
+        # IndexError covers a key table cut short.
+        return None
+
+def readLevelLayout(buffer: mmap.mmap, sourceName: str=None) -> LevelLayout:
+    if len(buffer) < LEVEL_HEADER.size:
+        return None
+    (magic, version, sourceCrc, sourceMtime, sourceSize, width, height, numLayers,
+     itemSize, numKeys, numEntities) = LEVEL_HEADER.unpack_from(buffer, 0)
+    if magic != LEVEL_FILE_MAGIC or version != LEVEL_FILE_VERSION:
+        return None
+    if sourceName is not None and sourceHasChanged(sourceName, sourceCrc,
+                                                   (sourceMtime, sourceSize)):
+        return None
+
+    offset = LEVEL_HEADER.size
+    keys = ['']
+    for _ in range(numKeys):
+        keyLength = buffer[offset]
+        keys.append(buffer[offset+1:offset+1+keyLength].decode('utf-8'))
+        offset += 1 + keyLength
+    offset += getPadding(offset)
+
+    gridDtype = np.dtype('<u1' if itemSize == 1 else '<u2')
+    entitiesOffset = offset + numLayers*height*width*gridDtype.itemsize
+    entitiesOffset += getPadding(entitiesOffset)
+    if len(buffer) != entitiesOffset + numEntities*ENTITY_DTYPE.itemsize:
+        return None
+
+    layers = np.frombuffer(buffer, dtype=gridDtype, count=numLayers*height*width,
+                           offset=offset).reshape(numLayers, height, width)
+    entities = np.frombuffer(buffer, dtype=ENTITY_DTYPE, count=numEntities,
+                             offset=entitiesOffset)
+    return LevelLayout(keys, layers, entities)
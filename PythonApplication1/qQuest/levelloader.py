@@ -0,0 +1,143 @@
+''' Levels built in the background, so that neither starting the game nor
+going through a portal waits on one.
+
+Building a Level comes in two halves (see Level.parseLayout).  Reading its
+file, building its tile arrays and visibility map, and compiling its
+background only touch the new Level, and happen on a worker thread.  Adding
+its items, characters and portals, which are Actors, happens on the main
+thread, in update(), once the first half is done.
+
+Portals between levels are linked by level name and portal index before
+either level need exist (linkPortals).  Once the player comes within
+LEVEL_PREFETCH_RADIUS cells of a portal, the level at its other end starts
+loading, and the two portals are coupled as soon as both levels are ready.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple
+
+from qQuest import constants
+from qQuest.game import GAME
+from qQuest.graphics import ASSETS
+from qQuest.levels import Level, Portal
+
+PortalEnd = Tuple[str, int] # (levelName, index into that level's portals)
+
+
+def buildLevelTiles(level: Level) -> Level:
+    ''' The worker half of building a level. '''
+    level.loadLevelFile()
+    level.buildTiles()
+    for pieceKey, _, tileGrid, tilesVersion in level.getTileGridPieces(range(level.mapWidth),
+                                                                     range(level.mapHeight)):
+        ASSETS.getCompiledLevelMap(level, pieceKey, tileGrid, tilesVersion)
+    return level
+
+
+class LevelLoader:
+    def __init__(self, numWorkers: int=None) -> None:
+        self.numWorkers = constants.LEVEL_LOADER_WORKERS if numWorkers is None else numWorkers
+        self.pool = None
+        self.levels = {}  # levelName -> Level, ready to play
+        self.loading = {} # levelName -> (Level, Future), tiles still being built
+        self.links = []   # (PortalEnd, PortalEnd) not yet coupled
+
+    def __getstate__(self) -> dict:
+        ''' Thread pools don't pickle (think saving the game); levels still
+        loading are dropped, and loaded again when next prefetched.'''
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['loading'] = {}
+        return state
+
+    def close(self) -> None:
+        ''' Stop building levels, for when this loader is being replaced (think
+        loading a saved game).'''
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.loading = {}
+
+    def loadNow(self, levelName: str) -> Level:
+        ''' levelName's Level, built on the spot if it isn't ready.  Only for
+        when there's nothing to show until it is, like the first level.'''
+        if levelName in self.levels:
+            return self.levels[levelName]
+        if levelName in self.loading:
+            level, future = self.loading.pop(levelName)
+            future.result()
+        else:
+            level = buildLevelTiles(Level(levelName, loadFromFile=False))
+        return self.finishLevel(levelName, level)
+
+    def prefetch(self, levelName: str) -> None:
+        ''' Start building levelName's Level, unless it is built or under way.
+        With no workers, it is built here and now.'''
+        if levelName in self.levels or levelName in self.loading:
+            return
+        level = Level(levelName, loadFromFile=False)
+        if self.numWorkers == 0:
+            self.finishLevel(levelName, buildLevelTiles(level))
+            return
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.numWorkers,
+                                           thread_name_prefix='levelLoader')
+        self.loading[levelName] = (level, self.pool.submit(buildLevelTiles, level))
+
+    def update(self, player: 'characters.Creature') -> None:
+        ''' Once a frame: finish the levels whose tiles are built, and prefetch
+        the far ends of portals near player.'''
+        for levelName, (level, future) in list(self.loading.items()):
+            if future.done():
+                del self.loading[levelName]
+                future.result() # raises here whatever went wrong on the worker
+                self.finishLevel(levelName, level)
+
+        if player is not None and player.level is not None:
+            self.prefetchNear(player)
+
+    def prefetchNear(self, player: 'characters.Creature') -> None:
+        radius = constants.LEVEL_PREFETCH_RADIUS
+        for end, otherEnd in self.getLinkEnds():
+            portal = self.getPortal(end)
+            if portal is None or portal.level is not player.level:
+                continue
+            if max(abs(portal.x - player.x), abs(portal.y - player.y)) <= radius:
+                self.prefetch(otherEnd[0])
+
+    def finishLevel(self, levelName: str, level: Level) -> Level:
+        ''' The main thread half of building a level. '''
+        level.addLayoutEntities()
+        self.levels[levelName] = level
+        GAME.levels.append(level)
+        self.coupleReadyLinks()
+        return level
+
+    def linkPortals(self, end0: PortalEnd, end1: PortalEnd) -> None:
+        ''' Couple the portals at end0 and end1 once both their levels are
+        ready.'''
+        self.links.append((end0, end1))
+        self.coupleReadyLinks()
+
+    def getLinkEnds(self) -> Iterator[Tuple[PortalEnd]]:
+        ''' Both ways round, every link not yet coupled. '''
+        for end0, end1 in self.links:
+            yield end0, end1
+            yield end1, end0
+
+    def getPortal(self, end: PortalEnd) -> Portal:
+        ''' The portal at end, or None if its level isn't ready. '''
+        levelName, portalIdx = end
+        level = self.levels.get(levelName)
+        return level.portals[portalIdx] if level is not None else None
+
+    def isLinked(self, portal: Portal) -> bool:
+        ''' Will portal be coupled, once the level at its other end is ready?'''
+        return any(self.getPortal(end) is portal for end, _ in self.getLinkEnds())
+
+    def coupleReadyLinks(self) -> None:
+        for link in list(self.links):
+            portals = [self.getPortal(end) for end in link]
+            if None not in portals:
+                GAME.couplePortals(*portals)
+                self.links.remove(link)
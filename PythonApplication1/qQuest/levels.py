@@ -1,24 +1,25 @@
+import collections
 import json
 import os
-import itertools
 import random
 from typing import List, Tuple
 
 import numpy as np
 import tcod as libtcod
 
-from qQuest import ai, constants
+from qQuest import ai, constants, levelfile, tilegrid
 
 from qQuest.constants import SpriteDict 
 from qQuest.characters import Creature, Combatant, Conversationalist, PlayerClass, Viewer
 from qQuest.items import Item, Equipment, Container
 from qQuest.game import GAME
-from qQuest.graphics import ASSETS, Actor #, compileBackgroundTiles
+from qQuest.perception import Perception
+from qQuest.scheduler import Scheduler
+from qQuest.graphics import ASSETS, Actor
 
 from qQuest.lib.itemLib import ITEMS
-from qQuest.lib.characterLib import CHARACTERS, NAMES
+from qQuest.lib.characterLib import CHARACTERS, NAMES, PLAYER
 from qQuest.lib.portalLib import PORTALS 
-from qQuest.lib.tileLib import TILES 
 
 
 class Portal(Actor):
@@ -42,20 +43,6 @@ class Portal(Actor):
         return
 
 
-class Tile(Actor):
-    ''' Tiles are Actor instances designed, principally, for walls and floors.
-    They are used to determine where a Creature and move and the influence of the
-    level on what a Viewer can see.  They are drawn beneath the other Actors,
-    and we expect one to be defined for every cell.'''
-
-    def __init__(self, pos: Tuple[int], blocking=False, seeThru=True, **kwargs):
-        self.blocking = blocking
-        self.seeThru = seeThru
-        super().__init__(pos, **kwargs)
-
-        self.depth = 'wallDepth' if blocking else 'floorDepth'
-
-
 class Level:
     numLevels = 0
 
@@ -64,28 +51,96 @@ class Level:
 
         # self.objects = [] #should this be a set?   would it simplify deletion?
         self.objects = {key:[] for key in constants.DEPTHS}
+        self.objectsByCoords = collections.defaultdict(list)
+
+        # live registries by type, so per-frame work can skip everything else.
+        self.creatures = []
+        self.viewers = []
+        self.items = []
         self.portals = []
 
+        # bumped whenever self.tileGrid changes, so cached renders know to rebuild.
+        self.tilesVersion = 0
+
+        self.perception = Perception(self, numWorkers=constants.FOV_WORKERS)
+        self.scheduler = Scheduler()
+
         if loadFromFile:
             self.loadLevelFile()
-            self.parseLevelDict()
+            self.parseLayout()
 
         self.uniqueID = f'level{Level.numLevels}'
         Level.numLevels += 1
 
+    @staticmethod
+    def reserveUniqueIDs(levels: List['Level']) -> None:
+        ''' Levels built from now on won't reuse the uniqueIDs of levels (say,
+        loaded from a save), which key their viewers' exploration history.'''
+        for level in levels:
+            Level.numLevels = max(Level.numLevels, int(level.uniqueID[len('level'):]) + 1)
+
     def addObject(self, newItem: Actor):
         ''' Objects (more properly, Actors) are kept by the Level instance
         in lists which are organized in a dictionary by depth, which is an 
         actor attr.  These depths are used later to set up the render order.
 
         DEPTHS = ['floorDepth', 'wallDepth', 'underEffectDepth', 'itemDepth', 
-                'charDepth','playerDepth', 'overEffectDepth', None]'''
+                'charDepth','playerDepth', 'overEffectDepth', None]
+
+        They are also kept in a spatial index, keyed by cell, so that position 
+        lookups don't need to scan every object in the level, and in per-type
+        registries (creatures, viewers, items, portals).  Creatures also join
+        the level's Scheduler.'''
         self.objects[newItem.depth].append(newItem)
+        self.objectsByCoords[(newItem.x, newItem.y)].append(newItem)
+        for registry in self._registriesFor(newItem):
+            registry.append(newItem)
+        if isinstance(newItem, Creature):
+            self.scheduler.add(newItem)
 
     def removeObject(self, item: Actor):
         for depth in constants.DEPTHS:
             if item in self.objects[depth]:
                 self.objects[depth].remove(item)
+        self._unindexObject(item)
+        for registry in self._registriesFor(item):
+            if item in registry:
+                registry.remove(item)
+        if isinstance(item, Creature):
+            self.scheduler.remove(item)
+
+    def _registriesFor(self, obj: Actor) -> List[List[Actor]]:
+        ''' Which of the per-type registries does obj belong in?'''
+        registries = []
+        if isinstance(obj, Creature):
+            registries.append(self.creatures)
+        if isinstance(obj, Viewer):
+            registries.append(self.viewers)
+        if isinstance(obj, Item):
+            registries.append(self.items)
+        if isinstance(obj, Portal):
+            registries.append(self.portals)
+        return registries
+
+    def moveObject(self, item: Actor, x: int, y: int) -> None:
+        ''' Change the cell (x,y) of an Actor, keeping the spatial index in
+        sync.  Anything that changes .x or .y of an Actor living in this level
+        should go through here.'''
+        indexed = self._unindexObject(item)
+        item.x, item.y = x, y
+        if indexed:
+            self.objectsByCoords[(x, y)].append(item)
+
+    def _unindexObject(self, item: Actor) -> bool:
+        ''' Drop item from the spatial index.  Returns whether it was there.'''
+        coords = (item.x, item.y)
+        cellObjects = self.objectsByCoords.get(coords)
+        if not cellObjects or item not in cellObjects:
+            return False
+        cellObjects.remove(item)
+        if not cellObjects:
+            del self.objectsByCoords[coords]
+        return True
 
     @property
     def allObjects(self):
@@ -95,101 +150,195 @@ class Level:
         return allObj
 
     def loadLevelFile(self) -> None:
-        ''' Loads self.levelDict dictionary from a saved .lvl file '''
-        filePath = os.path.join(os.path.dirname(__file__),"..","levels",self.levelName+".lvl")
-        with open(filePath, "r") as levelFile:
+        ''' Loads self.layout from the level's saved files: the binary .lvlb 
+        if it was converted from the current .lvl, otherwise the .lvl itself,
+        by way of self.levelDict.'''
+        filePath = os.path.join(os.path.dirname(__file__),"..","levels",self.levelName)
+        self.layout = levelfile.loadLevelLayout(filePath+".lvlb", sourceName=filePath+".lvl")
+        if self.layout is not None:
+            return
+
+        with open(filePath+".lvl", "r") as levelFile:
             self.levelDict = json.load(levelFile)
         levelFile.close()
+        self.layout = levelfile.layoutFromLevelDict(self.levelDict)
 
     def parseLevelDict(self) -> None:
-        ''' This parses the loaded level dictionary and populates the Level
-        instances tiles.  Floors, walls, items, monsters, portals.  All as
-        specified in the loaded dictionary.'''
-
-        levelArray = self.levelDict["level"]
-        decoder = self.levelDict["decoderRing"]
-
-        self.mapHeight = len(levelArray)
-        self.mapWidth = len(levelArray[0])
-
-        floorTile = ""#Tile("s_floor", blocking=False, seeThru=True)
-        self.map = [[[] for x in range(self.mapWidth )] for y in range(self.mapHeight)]
-
-        for (i, j) in itertools.product(range(self.mapHeight), range(self.mapWidth)):
-            allTiles = levelArray[i][j]
-            for tileChar in allTiles:
-                tileTypeKey = decoder[tileChar]
-                if tileTypeKey in TILES.keys():
-                    tileDict = TILES[tileTypeKey]
-                    self.map[i][j].append(Tile((j,i),**tileDict))
-                    continue
-
-                elif tileTypeKey == "player":
-                    # don't use this.  always add player at portal.
-                    continue
-
-                elif tileTypeKey in ITEMS.keys():
-                    self.addItem(j, i, tileTypeKey)
-                    continue
-
-                elif tileTypeKey in CHARACTERS.keys():
-                    self.addCharacter(j, i, tileTypeKey)
-                    continue
-
-                elif tileTypeKey in PORTALS.keys():
-                    self.addPortal(j, i, tileTypeKey) 
-                    continue
-
-                raise Exception(f"Failed at adding item during level parsing. {tileTypeKey}")
+        ''' Populates the Level from a level dictionary, in the format of a 
+        .lvl file, set as self.levelDict.'''
+        self.layout = levelfile.layoutFromLevelDict(self.levelDict)
+        self.parseLayout()
 
+    def parseLayout(self) -> None:
+        ''' This parses the loaded level layout and populates the Level
+        instances tiles.  Floors, walls, items, monsters, portals.  All as
+        specified in the loaded layout.  Tiles aren't Actors: they are kept
+        as arrays of tile types in self.tileGrid, see tilegrid.py.'''
+        self.buildTiles()
+        self.addLayoutEntities()
+
+    def buildTiles(self) -> None:
+        ''' The tile half of parseLayout: the TileGrid, the walkable and 
+        transparent maps, and the visibility map.  It only touches this Level,
+        so it can run on another thread while nothing else has hold of the 
+        Level yet (see levelloader.py).'''
+        self.mapHeight = self.layout.height
+        self.mapWidth = self.layout.width
+        self.tileGrid = tilegrid.tileGridFromLayout(self.layout)
+
+        self.initializeCellFlags()
         self.initializeVisibilityMap()
 
-    @property
-    def tilesFlattened(self) -> List[Tile]:
-        ''' Returns all of the 'background' tiles, in self.map, in a flattened
-        list for drawing.'''
-        bgTiles = {key:[] for key in constants.DEPTHS}
-        for row in self.map:
-            for position in row:
-                for tile in position:
-                    bgTiles[tile.depth].append(tile)
-        return bgTiles
+    def addLayoutEntities(self) -> None:
+        ''' The other half of parseLayout: the layout's items, characters and
+        portals, which are Actors, and so made on the main thread.'''
+        keys = self.layout.keys
+        for j, i, keyIdx in self.layout.entities.tolist():
+            self.addEntity(j, i, keys[keyIdx])
+
+    def addEntity(self, x: int, y: int, libKey: str) -> Actor:
+        ''' Add whatever a level file places at cell (x,y) under libKey: an 
+        item, a character, or a portal.  Returns the new Actor.'''
+        if libKey == "player":
+            # don't use this.  always add player at portal.
+            return None
+
+        elif libKey in ITEMS.keys():
+            return self.addItem(x, y, libKey)
+
+        elif libKey in CHARACTERS.keys():
+            return self.addCharacter(x, y, libKey)
+
+        elif libKey in PORTALS.keys():
+            return self.addPortal(x, y, libKey) 
+
+        raise Exception(f"Failed at adding item during level parsing. {libKey}")
+
+    def initializeCellFlags(self) -> None:
+        ''' self.walkable and self.transparent are (height, width) boolean 
+        arrays: can cell [y, x] be walked through, and seen through?  Both are
+        worked out from the tiles here, in one pass each, and from then on 
+        changed only through setCellTiles and setCellFlags.'''
+        self.walkable = ~self.tileGrid.getBlocking()
+        self.transparent = self.tileGrid.getSeeThru()
+
+    def newCellMap(self, dtype: type=bool, fill=False) -> np.ndarray:
+        ''' A fresh (height, width) array, one value per cell, all fill. '''
+        return np.full((self.mapHeight, self.mapWidth), fill, dtype=dtype)
+
+    def getTileGridPieces(self, xRange: range, yRange: range) -> List[tuple]:
+        ''' The TileGrids covering the cells in xRange, yRange, as (pieceKey,
+        upper left cell, tileGrid, tilesVersion) tuples.  A Level's tiles are 
+        all in one piece.'''
+        return [(None, (0, 0), self.tileGrid, self.tilesVersion)]
+
+    def setCellTiles(self, x: int, y: int, tileTypeKeys: List[str]) -> None:
+        ''' Replace the tiles at cell (x,y) with new ones, named by their keys 
+        in tileLib.  Think doors opening, or walls being knocked down.'''
+        self.tileGrid.setCellKeys(x, y, tileTypeKeys)
+        self.tilesVersion += 1
+        self.setCellFlags(x, y, walkable=not self.tileGrid.isBlocking(x, y),
+                          transparent=self.tileGrid.isSeeThru(x, y))
+
+    def setCellFlags(self, x: int, y: int, walkable: bool=None, 
+                     transparent: bool=None) -> None:
+        ''' Change whether cell (x,y) can be walked or seen through, leaving 
+        its tiles as they are; None leaves that flag alone.  Think of a door
+        drawn the same open or shut.  Viewers' FOVs are only recalculated when
+        the cell's transparency actually changes.'''
+        if walkable is not None:
+            self.walkable[y, x] = walkable
+        if transparent is not None and transparent != self.transparent[y, x]:
+            self.transparent[y, x] = transparent
+            self.transparencyVersion += 1
+            self.recalculateViewerFovs()
 
     def tileIsBlocking(self, x:int, y:int) -> bool:
         ''' Can we (not) walk through cell (x,y)?'''
-        return any([tile.blocking for tile in self.map[y][x]])
+        return not self.walkable[y, x]
 
     def initializeVisibilityMap(self) -> None:
         ''' The visibilityMap is a libtcod object for calculating the field of 
         view from any position.  This is a property of the Level.  computeFov() 
         uses this map to generate a Viewer-specific fov from its location.
-        '''
-        mapHeight = len(self.map)
-        mapWidth = len(self.map[0])
 
-        self.visibilityMap = libtcod.map.Map(width=mapWidth, height=mapHeight)
-        for (y, x) in itertools.product(range(mapHeight), range(mapWidth)):
-            seeThru = all([tile.seeThru for tile in self.map[y][x]])
-            self.visibilityMap.transparent[y][x] = seeThru
+        Anything that changes the transparency map afterwards should bump 
+        transparencyVersion, which invalidates the cached FOVs.
+        '''
+        self.visibilityMap = libtcod.map.Map(width=self.mapWidth, height=self.mapHeight)
+        self.visibilityMap.transparent[:] = self.transparent
+        self.transparent = self.visibilityMap.transparent # one array from here on
+        self.initializeFovCache()
+
+    def initializeFovCache(self) -> None:
+        self.transparencyVersion = 0
+        self.fovCache = collections.OrderedDict()
         self.recalculateViewerFovs()
 
     def recalculateViewerFovs(self) -> None:
-        # raise Exception
-        [obj.recalculateFov() for obj in self.allObjects if isinstance(obj, Viewer)]
-        # for obj in self.allObjects:
-        #     if isinstance(obj, Viewer):  
-        #         obj.recalculateFov()
+        for viewer in self.viewers:
+            self.perception.request(viewer)
+        self.perception.resolve()
   
     def computeFov(self, x: int, y: int) -> np.ndarray:
         ''' Using the boolean visibility map of the level, return the boolean 
         field of view may from a specific (x,y) position. x,y specificed in 
-        cells.  The returned array is of booleans.
+        cells.  The returned array is of booleans, map sized, and new.
         '''
-        self.visibilityMap.compute_fov(x, y,
-            radius = constants.FOV_RADIUS,
-            light_walls = constants.FOV_LIGHT_WALLS,
-            algorithm = constants.FOV_ALGO)
-        return self.visibilityMap.fov
+        return self.fovFromWindow(*self.computeFovWindow(x, y))
+
+    def fovFromWindow(self, origin: Tuple[int], window: np.ndarray) -> np.ndarray:
+        ''' Scatter an FOV window back into a new, map sized, array.'''
+        x0, y0 = origin
+        fov = np.zeros((self.mapHeight, self.mapWidth), dtype=bool)
+        fov[y0:y0+window.shape[0], x0:x0+window.shape[1]] = window
+        return fov
+
+    def computeFovWindow(self, x: int, y: int) -> Tuple[Tuple[int], np.ndarray]:
+        ''' Nothing outside of FOV_RADIUS from (x,y) can be seen, so libtcod 
+        is only run on that window of the map.  Returns the upper left cell 
+        of the window, and the (read-only) window of the FOV.  
+        
+        Results are cached by position and transparencyVersion, so pacing back 
+        and forth, or coming back to the level, doesn't recompute anything.'''
+        cachedWindow = self.getCachedFovWindow(x, y)
+        if cachedWindow is not None:
+            return cachedWindow
+
+        fovWindow = self.calculateFovWindow(x, y)
+        self.cacheFovWindow(x, y, fovWindow)
+        return fovWindow
+
+    def getCachedFovWindow(self, x: int, y: int) -> Tuple[Tuple[int], np.ndarray]:
+        ''' The cached result of computeFovWindow(x, y), or None. '''
+        cacheKey = (x, y, self.transparencyVersion)
+        if cacheKey not in self.fovCache:
+            return None
+        self.fovCache.move_to_end(cacheKey)
+        return self.fovCache[cacheKey]
+
+    def cacheFovWindow(self, x: int, y: int, fovWindow: Tuple[Tuple[int], np.ndarray]) -> None:
+        self.fovCache[(x, y, self.transparencyVersion)] = fovWindow
+        if len(self.fovCache) > constants.FOV_CACHE_SIZE:
+            self.fovCache.popitem(last=False)
+
+    def calculateFovWindow(self, x: int, y: int) -> Tuple[Tuple[int], np.ndarray]:
+        ''' The uncached guts of computeFovWindow.  It only reads the level, 
+        so it is safe to call from worker threads.'''
+        radius = constants.FOV_RADIUS
+        if radius > 0:
+            x0, x1 = max(0, x-radius), min(self.mapWidth, x+radius+1)
+            y0, y1 = max(0, y-radius), min(self.mapHeight, y+radius+1)
+        else: # libtcod takes radius 0 as unlimited
+            x0, x1, y0, y1 = 0, self.mapWidth, 0, self.mapHeight
+
+        window = libtcod.map.compute_fov(self.transparent[y0:y1, x0:x1],
+                                         (y-y0, x-x0),
+                                         radius = radius,
+                                         light_walls = constants.FOV_LIGHT_WALLS,
+                                         algorithm = constants.FOV_ALGO)
+        window.flags.writeable = False
+        return (x0, y0), window
                 
     def checkForCreature(self, x: int, y: int, excludeObject: Actor=None)->Actor:
         ''' Returns target creature instance if target location contains creature.
@@ -204,10 +353,10 @@ class Level:
 
     def objectsAtCoords(self,x: int,y: int) -> List[Actor]:
         '''Returns all objects at cell (x,y)?'''
-        return [obj for obj in self.allObjects if obj.x == x and obj.y == y]
+        return list(self.objectsByCoords.get((x, y), ()))
 
     def addCharacter(self, coordX: int, coordY: int, 
-                       name: str, uniqueName: str =None) -> None:
+                       name: str, uniqueName: str =None) -> Creature:
         ''' Place an enemy of type name (looked up in monsterLib) at coordinate
         cell (x,y).  Unique name is instance name of that particular monster.
         '''
@@ -230,6 +379,7 @@ class Level:
  
         # self.objects.append(enemy)
         self.addObject(enemy)
+        return enemy
 
     def addPlayer(self, x: int, y: int) -> None:
         ''' place player at (x,y).  This can mean creating a Player instance or
@@ -237,26 +387,26 @@ class Level:
         '''
         if GAME.player is None:
             playerInventory = Container()
-            playerSpriteDict = SpriteDict('dawnlike/Characters/humanoid0.png',
-                                           colIdx=0, rowIdx=3, numSprites=3)
             GAME.player = PlayerClass((x,y), name="hero", level=self,
-                                      spriteDict=(playerSpriteDict,),
+                                      spriteDict=PLAYER['spriteDict'],
                                       container=playerInventory, 
                                       speed=0.12)
         else:
+            if GAME.player.level is not None:
+                GAME.player.level.removeObject(GAME.player)
             GAME.player.x = x
             GAME.player.y = y
             GAME.player.level = self
             GAME.player.resyncGraphicPosition()
        
-        if GAME.player not in self.objects:
+        if GAME.player not in self.objects[GAME.player.depth]:
             self.addObject(GAME.player)
             # self.objects.append(GAME.player)
 
         GAME.player.initLevelExplorationHistory()
         self.recalculateViewerFovs()
 
-    def addItem(self, coordX: int, coordY: int, name: str) -> None:
+    def addItem(self, coordX: int, coordY: int, name: str) -> Item:
         ''' Place an item of type name (looked up in itemLib) at coordinate
         cell (x,y).  
         '''
@@ -266,21 +416,23 @@ class Level:
         item = newClass((coordX, coordY), level=self, **itemDict)
         self.addObject(item)
         # self.objects.append(item)
+        return item
 
-    def addPortal(self, coordX: int, coordY: int, name: str) -> None:
+    def addPortal(self, coordX: int, coordY: int, name: str) -> Portal:
         itemDict = PORTALS[name]
         item = Portal( (coordX, coordY), level=self, 
                         destinationPortal=None, **itemDict)
         # self.objects.append(item)
         self.addObject(item)
-        self.portals.append(item)
+        return item
 
     def placePlayerAtPortal(self, portal: Portal) -> None:
         self.addPlayer(portal.x, portal.y)
 
     def takeCreatureTurns(self) -> None:
-        for gameObj in self.allObjects:
-            if isinstance(gameObj, Creature):
-                gameObj.resolveQueueTick()
+        ''' One simulation tick.  Only creatures with something to do this 
+        tick act; see Scheduler.'''
+        self.scheduler.tick()
+        self.perception.resolve()
 
 
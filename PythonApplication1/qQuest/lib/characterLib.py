@@ -56,5 +56,9 @@ CHARACTERS['townNPC'] = {
        'scriptName' : 'baseNPCscript'
        }
 
+PLAYER = {
+       'spriteDict' : (SpriteDict('dawnlike/Characters/humanoid0.png',
+                                   colIdx=0, rowIdx=3, numSprites=3),)}
+
 NAMES = ['jonny', 'james', 'Mephisto, lord of terror',
          'janet', 'juliette', 'Andariel, queen of the succubi']
\ No newline at end of file
@@ -78,6 +78,8 @@ class Menu:
 
             self.redrawMenu()
 
+        graphics.invalidateScreen()
+
     def redrawMenu(self) -> None:
         ''' Redraw the menu, respecting FPS limits.'''
         self.menuSurface.fill(constants.COLOR_BLACK)
@@ -349,6 +351,16 @@ def loadGame(fname: str, game) -> None:
     game.viewer = newGame.viewer
     game.camera = newGame.camera
 
+    # The loader holds the loaded levels and the portal links still to couple.
+    if game.levelLoader is not None:
+        game.levelLoader.close()
+    game.levelLoader = getattr(newGame, 'levelLoader', None)
+    game.awaitedPortal = None
+
+    # imported here: levels imports characters, which imports this module.
+    from qQuest.levels import Level
+    Level.reserveUniqueIDs(game.levels)
+
 def listSavedGames() -> List[str]:
     saveFiles = []
     for f in os.listdir(SAVEPATH):
@@ -459,5 +471,8 @@ class HelpMenu(TextListMenu):
         self.addMenuItem('y   Go through portal', selectable=False, 
                                   textColorUnsel=constants.COLOR_WHITE,
                                   bgColorUnsel=constants.COLOR_BLACK)
+        self.addMenuItem('F3  Frame timings', selectable=False, 
+                                  textColorUnsel=constants.COLOR_WHITE,
+                                  bgColorUnsel=constants.COLOR_BLACK)
 
 
@@ -0,0 +1,61 @@
+''' Batched field of view computation for the Viewers of a Level.
+
+Rather than each Viewer running libtcod the moment it finishes a move, 
+Viewers ask the Level's Perception for a new FOV, and the requests are all 
+resolved together once per tick.  Viewers standing on the same cell share a
+computation, cached positions aren't recomputed at all, and the remaining 
+ones can be spread over a thread pool (libtcod releases the GIL).
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Perception:
+    def __init__(self, level: 'levels.Level', numWorkers: int=0):
+        self.level = level
+        self.numWorkers = numWorkers
+        self.pending = {} # id(viewer) -> viewer, in request order
+        self.pool = None
+
+    def __getstate__(self) -> dict:
+        ''' Thread pools don't pickle (think saving the game). '''
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def request(self, viewer: 'characters.Viewer') -> None:
+        ''' Ask for viewer's FOV to be recalculated at the next resolve().'''
+        self.pending[id(viewer)] = viewer
+
+    def resolve(self) -> None:
+        ''' Recalculate the FOV of every Viewer which asked for it. '''
+        if not self.pending:
+            return
+        viewers = [viewer for viewer in self.pending.values() 
+                   if viewer.level is self.level]
+        self.pending.clear()
+
+        fovWindows = {}
+        for viewer in viewers:
+            position = (viewer.x, viewer.y)
+            if position not in fovWindows:
+                fovWindows[position] = self.level.getCachedFovWindow(*position)
+
+        missing = [position for position, window in fovWindows.items() if window is None]
+        for position, fovWindow in zip(missing, self.calculateFovWindows(missing)):
+            self.level.cacheFovWindow(*position, fovWindow)
+            fovWindows[position] = fovWindow
+
+        for viewer in viewers:
+            viewer.setFovWindow(*fovWindows[(viewer.x, viewer.y)])
+
+    def calculateFovWindows(self, positions: list) -> list:
+        ''' FOV windows for each (x, y) in positions, on the worker threads 
+        if there are any and enough work to go around.'''
+        if self.numWorkers <= 0 or len(positions) < 2:
+            return [self.level.calculateFovWindow(*position) for position in positions]
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.numWorkers)
+        return list(self.pool.map(lambda position: self.level.calculateFovWindow(*position),
+                                  positions))
@@ -0,0 +1,119 @@
+''' Frame timing, without attaching a profiler.
+
+The main loop brackets each frame with startFrame/endFrame, and the parts of
+a frame it wants to see are timed with `with PROFILER.section(name):`.  The 
+last PROFILER_WINDOW frames are kept for rolling percentiles (the on-screen
+overlay, toggled in game), and every frame can be written out as a CSV row.
+'''
+
+import collections
+import contextlib
+import csv
+import time
+from typing import List
+
+import numpy as np
+
+try:
+    from qQuest import constants
+except ImportError:
+    import constants
+
+
+''' The sections of a frame, in the order they happen.  Anything else timed 
+still shows on the overlay, but doesn't get a CSV column.'''
+FRAME_SECTIONS = ['input', 'loading', 'creatures', 'camera', 'background', 'objects', 
+                  'fog', 'messages', 'chyron', 'debug', 'flip', 'tick']
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    def __init__(self, windowSize: int=constants.PROFILER_WINDOW) -> None:
+        self.frames = collections.deque(maxlen=windowSize) # of {section: seconds}
+        self.currentFrame = {}
+        self.frameStart = None
+        self.frameNum = 0
+        self.csvFile = None
+        self.csvWriter = None
+
+        self.showOverlay = False
+        self.overlayRows = []
+        self.overlayVersion = 0 # bumped whenever overlayRows change
+        self.lastOverlayRefresh = 0
+
+    def reset(self, windowSize: int=None) -> None:
+        ''' Forget all frames, optionally keeping a different number of them. '''
+        self.frames = collections.deque(maxlen=windowSize or self.frames.maxlen)
+        self.frameNum = 0
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - startTime
+            self.currentFrame[name] = self.currentFrame.get(name, 0.0) + elapsed
+
+    def startFrame(self) -> None:
+        self.currentFrame = {}
+        self.frameStart = time.perf_counter()
+
+    def endFrame(self) -> None:
+        if self.frameStart is None:
+            return
+        self.currentFrame['frame'] = time.perf_counter() - self.frameStart
+        self.frames.append(self.currentFrame)
+        if self.csvWriter is not None:
+            row = {name: round(seconds*1e3, 3) for name, seconds in self.currentFrame.items()}
+            row['frameNum'] = self.frameNum
+            self.csvWriter.writerow(row)
+        self.frameNum += 1
+        self.frameStart = None
+
+        if self.showOverlay:
+            now = time.perf_counter()
+            if now - self.lastOverlayRefresh > constants.PROFILER_REFRESH_MS / 1e3:
+                self.lastOverlayRefresh = now
+                self.overlayRows = self.getOverlayRows()
+                self.overlayVersion += 1
+
+    def toggleOverlay(self) -> None:
+        self.showOverlay = not self.showOverlay
+        self.overlayRows = self.getOverlayRows() if self.showOverlay else []
+        self.overlayVersion += 1
+
+    def getPercentiles(self, name: str) -> List[float]:
+        ''' PERCENTILES of a section over the window, in seconds.  A frame that
+        skipped the section counts as zero.'''
+        times = [frame.get(name, 0.0) for frame in self.frames]
+        if not times:
+            return [0.0 for _ in PERCENTILES]
+        return list(np.percentile(times, PERCENTILES))
+
+    def getOverlayRows(self) -> List[List[str]]:
+        ''' A table of section name and percentiles in ms, with a header. '''
+        names = ['frame'] + FRAME_SECTIONS
+        for frame in self.frames:
+            names.extend(name for name in frame if name not in names)
+        rows = [["ms"] + [f"p{percentile}" for percentile in PERCENTILES]]
+        for name in names:
+            rows.append([name] + ["{:.2f}".format(seconds*1e3) 
+                                  for seconds in self.getPercentiles(name)])
+        return rows
+
+    def startCsv(self, fileName: str) -> None:
+        ''' Write every following frame to fileName, times in ms. '''
+        self.csvFile = open(fileName, 'w', newline='')
+        self.csvWriter = csv.DictWriter(self.csvFile, extrasaction='ignore',
+                                        fieldnames=['frameNum', 'frame'] + FRAME_SECTIONS)
+        self.csvWriter.writeheader()
+
+    def stopCsv(self) -> None:
+        if self.csvFile is not None:
+            self.csvFile.close()
+        self.csvFile = None
+        self.csvWriter = None
+
+
+PROFILER = FrameProfiler()
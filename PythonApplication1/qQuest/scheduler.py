@@ -0,0 +1,153 @@
+''' Which Creatures of a Level need to act on a given simulation tick.
+
+Most of the time, most creatures are only counting down: waiting, thinking
+(QueuedAI), or recovering from an attack or from damage.  Rather than tick
+each of those down one at a time, the Scheduler puts the creature to sleep
+until the tick its current action finishes, and takes the skipped ticks off
+the action's remaining duration when it wakes.  Sleepers wait in a timing
+wheel, a bucket per wake-up tick.  A creature with nothing queued and no ai 
+sleeps until something is queued for it.
+
+Creatures due on a tick act in the order they were added to the level, the
+same order as Level.creatures, so a run plays out exactly as if every
+creature had been ticked.
+'''
+
+# Putting a creature to sleep and waking it again costs about as much as a
+# few ticks of counting down, so shorter countdowns are simply ticked.
+MIN_SLEEP_TICKS = 3
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self.tickNum = 0
+        self.nextSeq = 0
+        self.seqs = {}        # creature -> order the creature was added in
+        self.awake = []       # (seq, creature) ticked every tick, sorted
+        self.woken = []       # (seq, creature) to join awake next tick
+        self.sleeping = {}    # creature -> ((seq, creature), entry, sleptAt)
+        self.wheel = {}       # wakeTick -> [sleeping values, ...]
+        self.settling = []    # fell asleep last tick, see tick()
+        self.dueNow = None    # (seq, creature) due this tick, next to act last
+        self.removed = set()  # creatures removed during this tick
+        self.currentSeq = None
+
+    def add(self, creature: 'characters.Creature') -> None:
+        self.seqs[creature] = self.nextSeq
+        self.woken.append((self.nextSeq, creature))
+        self.nextSeq += 1
+
+    def remove(self, creature: 'characters.Creature') -> None:
+        scheduled = (self.seqs.pop(creature, None), creature)
+        self.sleeping.pop(creature, None)
+        for creatures in (self.awake, self.woken):
+            if scheduled in creatures:
+                creatures.remove(scheduled)
+        if self.dueNow is not None:
+            self.removed.add(creature) # may still be due this tick
+
+    @property
+    def numAwake(self) -> int:
+        return len(self.awake)
+
+    def tick(self) -> None:
+        self.tickNum += 1
+
+        # a sleeping creature's graphic position doesn't change, but the one
+        # remembered for interpolation must catch up with its last move.
+        for creature in self.settling:
+            creature.storeGraphicPosition()
+        self.settling = []
+
+        woken, self.woken = self.woken, []
+        sleeping = self.sleeping
+        for sleeper in self.wheel.pop(self.tickNum, ()):
+            scheduled = sleeper[0]
+            if sleeping.get(scheduled[1]) is sleeper: # not woken early
+                self.wakeUp(scheduled[1], self.tickNum)
+                woken.append(scheduled)
+
+        # rather than being sorted into self.awake, the woken act from 
+        # dueNow, merged in between the awake creatures by seq.  Each creature
+        # goes back into self.awake as it acts, so it stays sorted, and is 
+        # taken out again if it falls asleep (see sleep).
+        woken.sort(reverse=True)
+        self.dueNow = dueNow = woken
+        self.removed = removed = set()
+        due, self.awake = self.awake, []
+        awake = self.awake
+        for scheduled in due:
+            seq, creature = scheduled
+            if dueNow and dueNow[-1][0] < seq:
+                self.actDueNow(seq)
+            if removed and creature in removed:
+                continue # removed this tick, before its turn
+            self.currentSeq = seq
+            awake.append(scheduled)
+            creature.resolveQueueTick()
+        self.actDueNow(None)
+        self.dueNow = None
+        self.currentSeq = None
+
+    def actDueNow(self, beforeSeq: int) -> None:
+        ''' Let creatures woken for this tick act, up to beforeSeq. '''
+        dueNow, removed = self.dueNow, self.removed
+        while dueNow and (beforeSeq is None or dueNow[-1][0] < beforeSeq):
+            scheduled = dueNow.pop()
+            seq, creature = scheduled
+            if removed and creature in removed:
+                continue # removed since it was woken
+            self.currentSeq = seq
+            self.awake.append(scheduled)
+            creature.resolveQueueTick()
+
+    def sleep(self, creature: 'characters.Creature', entry: 'actions.QueueEntry'=None) -> None:
+        ''' creature, acting now, will only be counting entry down until it 
+        completes; or, without an entry, has nothing to do at all.  Let it 
+        sleep until then.'''
+        if self.dueNow is None or creature not in self.seqs:
+            return # not ticked by this Scheduler
+        if entry is not None:
+            idleTicks = entry.getIdleTicks()
+            if idleTicks < MIN_SLEEP_TICKS:
+                entry.idles = False # it only gets shorter, so don't ask again
+                return
+
+        # each creature keeps the one (seq, creature) it is scheduled by, and
+        # a nap makes just the one tuple: fewer allocations, fewer collections.
+        if self.awake and self.awake[-1][1] is creature:
+            scheduled = self.awake.pop() # put back just before it acted
+        else:
+            scheduled = (self.seqs[creature], creature)
+        sleeper = (scheduled, entry, self.tickNum)
+        if entry is not None:
+            wakeTick = self.tickNum + idleTicks + 1
+            self.wheel.setdefault(wakeTick, []).append(sleeper)
+        self.sleeping[creature] = sleeper
+        self.settling.append(creature)
+
+    def wake(self, creature: 'characters.Creature') -> None:
+        ''' Called when creature's action queue changed.  Only if its current
+        action was replaced does it need waking early.'''
+        sleeper = self.sleeping.get(creature)
+        if sleeper is None:
+            return
+        scheduled, entry, _ = sleeper
+        if creature.actionQueue and creature.actionQueue[-1] is entry:
+            return
+
+        # creatures after the one acting now still get this tick
+        if self.dueNow is not None and scheduled[0] > self.currentSeq:
+            self.wakeUp(creature, self.tickNum)
+            self.dueNow.append(scheduled)
+            self.dueNow.sort(reverse=True)
+        else:
+            self.wakeUp(creature, self.tickNum + 1)
+            self.woken.append(scheduled)
+
+    def wakeUp(self, creature: 'characters.Creature', nextTick: int) -> None:
+        ''' Take creature off the sleeping list, to act next on nextTick, and
+        count its current action down by the ticks it slept through.'''
+        _, entry, sleptAt = self.sleeping.pop(creature)
+        if entry is not None:
+            entry.tick(nextTick - sleptAt - 1)
@@ -0,0 +1,73 @@
+''' The tiles of a Level--floors, walls, and the like--kept as arrays of tile
+type ids rather than as an Actor per tile.
+
+Every tile in tileLib has a type id, its index in TILE_TYPE_KEYS; id 0 is no
+tile at all.  What a type is like is looked up by id in the TILE_* tables.
+A TileGrid holds a (numLayers, height, width) array of type ids, a cell's
+tiles being read from the bottom layer up.
+'''
+
+from typing import List
+
+import numpy as np
+
+from qQuest.lib.tileLib import TILES
+
+TILE_TYPE_KEYS = [None] + list(TILES)
+TILE_TYPE_IDS = {key: typeId for typeId, key in enumerate(TILE_TYPE_KEYS)}
+TILE_BLOCKING = np.array([False] + [TILES[key].get('blocking', False) for key in TILES])
+TILE_SEE_THRU = np.array([True] + [TILES[key].get('seeThru', True) for key in TILES])
+TILE_SPRITE_DICTS = [None] + [TILES[key]['spriteDict'] for key in TILES]
+TILE_DEPTHS = [None] + ['wallDepth' if blocking else 'floorDepth'
+                        for blocking in TILE_BLOCKING[1:]]
+
+
+class TileGrid:
+    def __init__(self, typeIds: np.ndarray) -> None:
+        self.typeIds = typeIds
+
+    @property
+    def width(self) -> int:
+        return self.typeIds.shape[2]
+
+    @property
+    def height(self) -> int:
+        return self.typeIds.shape[1]
+
+    def getCellKeys(self, x: int, y: int) -> List[str]:
+        ''' tileLib keys of the tiles at cell (x,y), bottom first. '''
+        return [TILE_TYPE_KEYS[typeId] for typeId in self.typeIds[:, y, x] if typeId]
+
+    def setCellKeys(self, x: int, y: int, tileTypeKeys: List[str]) -> None:
+        ''' Replace the tiles at cell (x,y), adding layers if need be. '''
+        numLayers = len(self.typeIds)
+        if len(tileTypeKeys) > numLayers:
+            extraLayers = np.zeros((len(tileTypeKeys) - numLayers, self.height, self.width),
+                                   dtype=self.typeIds.dtype)
+            self.typeIds = np.concatenate([self.typeIds, extraLayers])
+        self.typeIds[:, y, x] = 0
+        self.typeIds[:len(tileTypeKeys), y, x] = [TILE_TYPE_IDS[key] for key in tileTypeKeys]
+
+    def isBlocking(self, x: int, y: int) -> bool:
+        return bool(TILE_BLOCKING[self.typeIds[:, y, x]].any())
+
+    def isSeeThru(self, x: int, y: int) -> bool:
+        return bool(TILE_SEE_THRU[self.typeIds[:, y, x]].all())
+
+    def getBlocking(self) -> np.ndarray:
+        ''' (height, width) booleans: does any tile block the way? '''
+        return TILE_BLOCKING[self.typeIds].any(axis=0)
+
+    def getSeeThru(self) -> np.ndarray:
+        ''' (height, width) booleans: can you see through every tile? '''
+        return TILE_SEE_THRU[self.typeIds].all(axis=0)
+
+def getTypeIdsByKey(keys: List[str]) -> np.ndarray:
+    ''' Lookup table from indices into keys, a LevelLayout's key table, to 
+    tile type ids.  Keys which aren't tiles map to 0.'''
+    return np.array([TILE_TYPE_IDS.get(key, 0) for key in keys], dtype=np.uint16)
+
+def tileGridFromLayout(layout: 'levelfile.LevelLayout') -> TileGrid:
+    ''' The tiles of a LevelLayout, whose layers are indices into its own key
+    table, as tile type ids.'''
+    return TileGrid(getTypeIdsByKey(layout.keys)[layout.layers])
@@ -0,0 +1,103 @@
+''' Saving and loading a game, then going through portals whose levels haven't
+loaded yet.  Like the benchmarks, run from the repository root so that sprite
+paths resolve:
+    python -m pytest PythonApplication1/tests
+'''
+
+import importlib.util
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from qQuest import constants, menus
+from qQuest.game import GAME
+from qQuest.levels import Level
+
+LOAD_TIMEOUT = 30 # seconds
+
+
+def loadGameModule():
+    ''' The game's qQuest.py, which shares its name with the qQuest package. '''
+    fileName = os.path.join(os.path.dirname(__file__), '..', 'qQuest.py')
+    spec = importlib.util.spec_from_file_location('qQuestMain', fileName)
+    gameModule = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gameModule)
+    return gameModule
+
+def startGame(worldSeed: int=None):
+    ''' A new game, as if in a freshly started process. '''
+    if GAME.levelLoader is not None:
+        GAME.levelLoader.close()
+    GAME.__init__()
+    Level.numLevels = 0
+    gameModule = loadGameModule()
+    gameModule.initializeDisplay()
+    gameModule.initializeGame(worldSeed)
+
+def saveAndLoad():
+    menus.gameSave(GAME, 'test')
+    saveName = menus.listSavedGames()[0]
+    startGame()
+    menus.loadGame(saveName, GAME)
+    os.remove(os.path.join(menus.SAVEPATH, saveName))
+
+def goThroughPortal(portal, levelName: str) -> None:
+    ''' Step onto portal and wait for the level behind it to load. '''
+    level = portal.level
+    level.moveObject(GAME.player, portal.x, portal.y)
+    GAME.transitPortal(portal)
+    deadline = time.monotonic() + LOAD_TIMEOUT
+    while GAME.currentLevel is level and time.monotonic() < deadline:
+        GAME.updateLevels()
+        time.sleep(0.01)
+    assert GAME.currentLevel.levelName == levelName
+    assert GAME.player.level is GAME.currentLevel
+    assert portal.destinationPortal.level is GAME.currentLevel
+
+def testTransitAfterLoad(tmp_path, monkeypatch):
+    monkeypatch.setattr(menus, 'SAVEPATH', str(tmp_path))
+    startGame()
+    saveAndLoad()
+    assert GAME.awaitedPortal is None
+
+    level = GAME.currentLevel
+    assert level in GAME.levels and level.levelName == "town3"
+    goThroughPortal(level.portals[0], "mapwPIES4")
+
+def testLevelsBuiltAfterLoadGetNewIDs(tmp_path, monkeypatch):
+    ''' Levels built after loading mustn't take the uniqueID of a loaded one,
+    which keys the player's exploration history.'''
+    monkeypatch.setattr(menus, 'SAVEPATH', str(tmp_path))
+    startGame()
+    goThroughPortal(GAME.currentLevel.portals[0], "mapwPIES4")
+    saveAndLoad()
+
+    assert GAME.currentLevel.levelName == "mapwPIES4"
+    goThroughPortal(GAME.currentLevel.portals[1], "mapwPIES3")
+    uniqueIDs = [level.uniqueID for level in GAME.levels]
+    assert len(set(uniqueIDs)) == len(uniqueIDs)
+
+def testChunksEvictedBeforeSaveSurviveLoad(tmp_path, monkeypatch):
+    ''' A world's evicted chunks live in a temporary directory, which is gone
+    by the time the game is loaded in another process.'''
+    monkeypatch.setattr(menus, 'SAVEPATH', str(tmp_path))
+    startGame(worldSeed=1)
+    world = GAME.currentLevel
+    x, y = GAME.player.x, GAME.player.y
+    world.setCellTiles(x+1, y, ['wall_dungeon_1'])
+    world.moveObject(GAME.player, x + 4*constants.CHUNK_SIZE, y)
+    world.updateChunks()
+    assert (x // constants.CHUNK_SIZE, y // constants.CHUNK_SIZE) not in world.chunks
+
+    saveAndLoad()
+    world.cacheDir.cleanup()
+    world = GAME.currentLevel
+    assert world.chunkLock.acquire(timeout=LOAD_TIMEOUT)
+    world.chunkLock.release()
+    world.moveObject(GAME.player, x, y)
+    world.updateChunks()
+    assert not world.walkable[y, x+1]